@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Node-resident sampling agent for long soak tests.
+
+The agent is a small shell loop started on the node in its own session. It
+appends one compact line per sample to a file on the node::
+
+    <timestamp> <aggregate /proc/stat cpu counters> MemTotal=<kB> ... .
+
+The library pulls the lines in bulk chunks, optionally gzip compressed, so
+the sample timing does not depend on the transport and hours of samples
+cost a handful of round trips.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import uuid
+import zlib
+import base64
+from collections import OrderedDict
+
+from .instrument import send
+from .proc import Sample, split_sections
+
+
+#: /proc/meminfo fields recorded by the agent.
+MEMINFO_FIELDS = (
+    'MemTotal', 'MemFree', 'MemAvailable', 'Buffers', 'Cached',
+    'SReclaimable'
+)
+
+
+def agent_script(path, interval):
+    """
+    Shell loop appending one sample line to ``path`` every ``interval``
+    seconds. It holds no single quote, so it can be wrapped in ``sh -c``.
+    """
+
+    fields = '|'.join(field + ':' for field in MEMINFO_FIELDS)
+    return (
+        'while :; do t=$(date +%s.%N); read _ c < /proc/stat; m=; '
+        'while read k v _; do case $k in {fields}) m="$m ${{k%:}}=$v";; '
+        'esac; done < /proc/meminfo; '
+        'echo "$t $c$m ." >> {path}; sleep {interval}; done'
+    ).format(fields=fields, path=path, interval=interval)
+
+
+def parse_line(line):
+    """
+    Decode one agent sample line.
+
+    >>> sample = parse_line('12.5 1 0 1 8 0 0 0 0 0 0 MemTotal=2048 .')
+    >>> sample.timestamp, sample.cpu['cpu'][3], sample.meminfo['MemTotal']
+    (12.5, 8, 2048)
+
+    :param str line: a line of the agent file.
+    :rtype: :class:`topology_lib_systemctl.proc.Sample`
+    :return: The sample, or None for a malformed line.
+    """
+
+    fields = line.split()
+    if not fields or fields[-1] != '.':
+        return None
+    try:
+        timestamp = float(fields[0])
+        counters = []
+        meminfo = OrderedDict()
+        for field in fields[1:-1]:
+            key, sep, value = field.partition('=')
+            if sep:
+                meminfo[key] = int(value)
+            else:
+                counters.append(int(field))
+    except ValueError:
+        return None
+    counters = (counters + [0] * 8)[:8]
+    return Sample(timestamp, OrderedDict([('cpu', counters)]), meminfo)
+
+
+class SamplingAgent(object):
+    """
+    Handle of a sampling agent running on the node.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param float interval: seconds between two samples.
+    :param str path: file the agent writes on the node; a unique file in
+        ``/tmp`` if not given.
+    :param bool compress: gzip and base64 encode the pulled chunks.
+    """
+
+    def __init__(self, enode, interval=1.0, path=None, compress=False):
+        assert interval > 0, "interval must be positive"
+        self.enode = enode
+        self.interval = interval
+        self.path = path or '/tmp/systemctl-agent-{}.log'.format(
+            uuid.uuid4().hex[:8]
+        )
+        self.compress = compress
+        self.pid = None
+        self.offset = 0
+
+    def start(self):
+        """
+        Start the agent on the node with one enode call.
+
+        :return: The agent itself.
+        """
+
+        assert self.pid is None, "agent already started"
+        # The agent reports its own PID: under job control setsid forks, so
+        # $! would not be the session leader. The pipe to cat returns once
+        # the agent has printed it and detached from the output.
+        cmd = (
+            ": > {path}; "
+            "{{ setsid sh -c 'echo \"@@pid $$\"; "
+            "exec </dev/null >/dev/null 2>&1; {script}' & }} | cat"
+        ).format(path=self.path, script=agent_script(self.path, self.interval))
+        for name in split_sections(send(self.enode, cmd, shell='bash')):
+            fields = name.split()
+            if len(fields) == 2 and fields[0] == 'pid':
+                self.pid = int(fields[1])
+        assert self.pid is not None, "could not start the sampling agent"
+        return self
+
+    def pull(self, limit=10000):
+        """
+        Fetch up to ``limit`` samples not pulled yet, with one enode call.
+
+        :param int limit: maximum number of samples in the chunk.
+        :rtype: list
+        :return: The list of :class:`topology_lib_systemctl.proc.Sample`.
+        """
+
+        assert limit > 0, "limit must be positive"
+        # One extra line tells whether the last line of the chunk is the
+        # end of the file, which the agent may still be writing
+        lines = "tail -n +{start} {path} | head -n {limit}".format(
+            start=self.offset + 1, path=self.path, limit=limit + 1
+        )
+        if self.compress:
+            lines += " | gzip -c | base64"
+        output = send(self.enode, "echo @@chunk; " + lines, shell='bash')
+        chunk = split_sections(output).get('chunk', [])
+
+        if self.compress:
+            data = base64.b64decode(''.join(line.strip() for line in chunk))
+            chunk = zlib.decompress(data, 16 + zlib.MAX_WBITS).decode(
+                'utf-8'
+            ).splitlines()
+
+        if len(chunk) > limit:
+            chunk = chunk[:limit]
+        elif chunk and not chunk[-1].rstrip().endswith(' .'):
+            chunk = chunk[:-1]
+        self.offset += len(chunk)
+        samples = []
+        for line in chunk:
+            sample = parse_line(line)
+            if sample is not None:
+                samples.append(sample)
+        return samples
+
+    def pull_all(self, chunk=10000):
+        """
+        Fetch every sample not pulled yet, in chunks of ``chunk`` samples.
+
+        :rtype: list
+        """
+
+        samples = []
+        while True:
+            offset = self.offset
+            samples.extend(self.pull(chunk))
+            # Malformed lines are consumed without giving a sample
+            if self.offset - offset < chunk:
+                return samples
+
+    def stop(self, remove=True):
+        """
+        Stop the agent with one enode call.
+
+        :param bool remove: also delete the sample file on the node; pull
+            the samples first.
+        """
+
+        if self.pid is None:
+            return
+        cmd = "kill -TERM -- -{pid} 2>/dev/null".format(pid=self.pid)
+        if remove:
+            cmd += "; rm -f {path}".format(path=self.path)
+        send(self.enode, cmd, shell='bash')
+        self.pid = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop(remove=False)
+
+
+__all__ = [
+    'MEMINFO_FIELDS',
+    'agent_script',
+    'parse_line',
+    'SamplingAgent'
+]
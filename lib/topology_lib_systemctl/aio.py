@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+asyncio adapter for the library functions.
+
+The engine node callables are blocking, so every library call is run in a
+worker thread and awaited from the event loop. Calls on one node are
+serialized (or bounded) while calls on different nodes run concurrently.
+A call only takes an executor worker once its node is free, so calls queued
+on a busy node do not hold up the other nodes::
+
+    nodes = [AsyncEnode(sw1), AsyncEnode(sw2)]
+    failed = await asyncio.gather(
+        *(node.check_failed_services() for node in nodes)
+    )
+
+The adapter uses no ``async``/``await`` syntax, so the module stays
+importable everywhere; :class:`AsyncEnode` itself needs asyncio (Python
+3.4 or later).
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from functools import partial
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+from . import library
+
+
+class AsyncEnode(object):
+    """
+    Awaitable wrapper around a blocking engine node.
+
+    Every function in ``library.__all__`` is available as a method taking
+    the same arguments minus the engine node and returning an awaitable
+    future, for example ``await node.get_cpu_usage(window=1)``.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param int max_concurrency: maximum number of calls in flight on this
+        node at once. Interactive shells only support one.
+    :param concurrent.futures.Executor executor: executor running the
+        blocking calls; the loop default executor if not given.
+    """
+
+    def __init__(self, enode, max_concurrency=1, executor=None):
+        assert asyncio is not None, "asyncio is not available"
+        assert max_concurrency > 0, "max_concurrency must be positive"
+        self.enode = enode
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._semaphore = None
+
+    def _node_semaphore(self, loop):
+        # asyncio primitives belong to one event loop
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _in_executor(self, function, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        semaphore = self._node_semaphore(loop)
+        result = asyncio.Future(loop=loop)
+        acquiring = loop.create_task(semaphore.acquire())
+
+        def finished(work):
+            semaphore.release()
+            if result.cancelled():
+                return
+            if work.cancelled():
+                result.cancel()
+            elif work.exception() is not None:
+                result.set_exception(work.exception())
+            else:
+                result.set_result(work.result())
+
+        def acquired(task):
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                result.set_exception(task.exception())
+                return
+            if result.cancelled():
+                semaphore.release()
+                return
+            # The executor is only used once the node slot is taken
+            work = loop.run_in_executor(
+                self.executor, partial(function, *args, **kwargs)
+            )
+            work.add_done_callback(finished)
+
+        def abandoned(future):
+            if future.cancelled():
+                acquiring.cancel()
+
+        acquiring.add_done_callback(acquired)
+        result.add_done_callback(abandoned)
+        return result
+
+    def run(self, command, shell='bash'):
+        """
+        Send one command to the node without blocking the event loop.
+
+        :param str command: command to run.
+        :param str shell: shell to run it in.
+        :rtype: asyncio.Future
+        :return: A future of the command output.
+        """
+
+        return self._in_executor(self.enode, command, shell=shell)
+
+    def call(self, function, *args, **kwargs):
+        """
+        Run a library function against the node without blocking the event
+        loop.
+
+        :param function: name of a function in ``library.__all__``, or any
+            callable taking an engine node as first argument.
+        :rtype: asyncio.Future
+        :return: A future of the function return value.
+        """
+
+        if not callable(function):
+            assert function in library.__all__, \
+                "{} is not a library function".format(function)
+            function = getattr(library, function)
+        return self._in_executor(function, self.enode, *args, **kwargs)
+
+    def __getattr__(self, name):
+        if name not in library.__all__:
+            raise AttributeError(name)
+        return partial(self.call, name)
+
+
+__all__ = [
+    'AsyncEnode'
+]
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Parsing and comparison of ``systemd-analyze`` startup reports.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import re
+from collections import OrderedDict
+
+
+_SPAN = re.compile(r'(\d+(?:\.\d+)?)\s*(min|ms|us|µs|h|d|s)\b')
+
+_UNITS = {
+    'd': 86400.0, 'h': 3600.0, 'min': 60.0, 's': 1.0, 'ms': 1e-3,
+    'us': 1e-6, 'µs': 1e-6
+}
+
+_STAGE = re.compile(r'([\dhmindsµu. ]+?)\s*\((\w+)\)')
+
+_LINK = re.compile(r'^(\S+)\s+@(.+?)(?:\s+\+(.+))?$')
+
+
+def parse_span(text):
+    """
+    Convert a systemd time span to seconds.
+
+    >>> parse_span('1min 2.5s')
+    62.5
+    >>> parse_span('250ms')
+    0.25
+
+    :param str text: time span as printed by systemd.
+    :rtype: float
+    :return: The span in seconds, or None if the text holds no span.
+    """
+
+    matches = _SPAN.findall(text)
+    if not matches:
+        return None
+    return sum(float(value) * _UNITS[unit] for value, unit in matches)
+
+
+def parse_time(output):
+    """
+    Parse ``systemd-analyze time``.
+
+    :param str output: raw command output.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each boot stage (``firmware``,
+        ``loader``, ``kernel``, ``initrd``, ``userspace``) to seconds, plus
+        the ``total``.
+    """
+
+    stages = OrderedDict()
+    for line in output.splitlines():
+        if not line.startswith('Startup finished in '):
+            continue
+        body = line[len('Startup finished in '):]
+        head, _, total = body.rpartition('=')
+        for span, stage in _STAGE.findall(head):
+            stages[stage] = parse_span(span)
+        stages['total'] = parse_span(total)
+    return stages
+
+
+def parse_blame(output):
+    """
+    Parse ``systemd-analyze blame``.
+
+    >>> blame = parse_blame('1min 2s a.service\\n  300ms b.service')
+    >>> blame == {'a.service': 62.0, 'b.service': 0.3}
+    True
+
+    :param str output: raw command output.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each unit to its activation time in
+        seconds, slowest first.
+    """
+
+    blame = OrderedDict()
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 2 or '.' not in fields[-1]:
+            continue
+        span = parse_span(' '.join(fields[:-1]))
+        if span is not None:
+            blame[fields[-1]] = span
+    return blame
+
+
+class ChainLink(object):
+    """
+    One unit of the startup critical chain.
+
+    :param str unit: unit name.
+    :param float activated: seconds after boot at which the unit became
+        active.
+    :param float duration: seconds the unit took to start, or None if
+        systemd did not report it.
+    """
+
+    __slots__ = ('unit', 'activated', 'duration')
+
+    def __init__(self, unit, activated, duration=None):
+        self.unit = unit
+        self.activated = activated
+        self.duration = duration
+
+    def __repr__(self):
+        return 'ChainLink({!r}, {!r}, {!r})'.format(
+            self.unit, self.activated, self.duration
+        )
+
+
+def parse_critical_chain(output):
+    """
+    Parse ``systemd-analyze critical-chain``.
+
+    :param str output: raw command output.
+    :rtype: list
+    :return: The list of :class:`ChainLink` in boot order, from the first
+        unit of the chain up to the target.
+    """
+
+    chain = []
+    for line in output.splitlines():
+        line = line.lstrip(' \t│├└─|`-')
+        if not line or line.startswith('The time'):
+            continue
+        match = _LINK.match(line.strip())
+        if match is None or '.' not in match.group(1):
+            continue
+        activated = parse_span(match.group(2))
+        if activated is None:
+            continue
+        duration = parse_span(match.group(3)) if match.group(3) else None
+        chain.append(ChainLink(match.group(1), activated, duration))
+    chain.reverse()
+    return chain
+
+
+class BootAnalysis(object):
+    """
+    Startup report of one boot.
+
+    :param OrderedDict stages: :func:`parse_time` result.
+    :param OrderedDict blame: :func:`parse_blame` result.
+    :param list chain: :func:`parse_critical_chain` result.
+    """
+
+    __slots__ = ('stages', 'blame', 'chain')
+
+    def __init__(self, stages, blame, chain):
+        self.stages = stages
+        self.blame = blame
+        self.chain = chain
+
+    @property
+    def critical_path(self):
+        """
+        Unit names of the critical chain, in boot order.
+        """
+
+        return [link.unit for link in self.chain]
+
+
+def diff_boots(before, after, threshold=0.0):
+    """
+    Compare the startup reports of two boots or two builds.
+
+    :param BootAnalysis before: reference report.
+    :param BootAnalysis after: report to compare.
+    :param float threshold: only report units whose activation time changed
+        by more than this many seconds.
+    :rtype: dict
+    :return: A dictionary with the per ``stages`` and per ``units``
+        (before, after, delta) seconds, the units sorted by largest
+        regression first, the ``added`` and ``removed`` units, and the units
+        that ``entered`` or ``left`` the critical path.
+    """
+
+    stages = OrderedDict()
+    for stage in after.stages:
+        if stage in before.stages:
+            stages[stage] = (
+                before.stages[stage], after.stages[stage],
+                after.stages[stage] - before.stages[stage]
+            )
+
+    units = [
+        (unit, before.blame[unit], span, span - before.blame[unit])
+        for unit, span in after.blame.items()
+        if unit in before.blame and
+        abs(span - before.blame[unit]) > threshold
+    ]
+    units.sort(key=lambda entry: entry[3], reverse=True)
+
+    before_path = set(before.critical_path)
+    after_path = set(after.critical_path)
+    return {
+        'stages': stages,
+        'units': OrderedDict(
+            (unit, (old, new, delta)) for unit, old, new, delta in units
+        ),
+        'added': [unit for unit in after.blame if unit not in before.blame],
+        'removed': [
+            unit for unit in before.blame if unit not in after.blame
+        ],
+        'entered': [
+            unit for unit in after.critical_path if unit not in before_path
+        ],
+        'left': [
+            unit for unit in before.critical_path if unit not in after_path
+        ],
+    }
+
+
+__all__ = [
+    'parse_span',
+    'parse_time',
+    'parse_blame',
+    'parse_critical_chain',
+    'ChainLink',
+    'BootAnalysis',
+    'diff_boots'
+]
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Merge several library calls into a single enode round trip.
+
+Calls made on a :class:`Batch` are queued and return a :class:`BatchCall`
+handle. When the batch is flushed, or the ``with`` block exits, the first
+command of every queued call is sent in one delimited shell script and each
+call is then completed from its slice of the output::
+
+    with Batch(sw1) as batch:
+        failed = batch.check_failed_services()
+        memory = batch.get_memory_usage()
+        cpu = batch.get_cpu_usage(window=1)
+    print(failed.result(), memory.result(), cpu.result())
+
+Functions issuing more than one command, such as :func:`get_cpu_usage`
+without a window, have their later commands sent to the node as usual once
+the batch output has been replayed. Functions returning a generator,
+starting a thread or starting a background process on the node, listed in
+:data:`UNBATCHABLE`, cannot be batched. A call whose replay issues a
+different first command than the one batched fails instead of sending it.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import uuid
+from functools import partial
+from inspect import isgenerator
+
+from . import library
+from .instrument import send
+from .proc import split_sections
+
+
+#: Library functions returning a generator, starting a background thread or
+#: starting a process on the node, which would outlive the batch.
+UNBATCHABLE = (
+    'read_journal', 'start_resource_sampler', 'start_sampling_agent'
+)
+
+
+class _Deferred(BaseException):
+    """
+    Raised by the recording engine node to stop a call at its first command.
+
+    It is not an :class:`Exception` so that the library and the
+    instrumentation do not mistake it for a command failure.
+    """
+
+
+class _WrappedEnode(object):
+    """
+    Engine node stand-in that hashes and compares equal to the engine node
+    it wraps, so the per node unit caches and journal cursors are shared.
+    """
+
+    def __init__(self, enode):
+        self.enode = enode
+
+    def __hash__(self):
+        return hash(self.enode)
+
+    def __eq__(self, other):
+        if isinstance(other, _WrappedEnode):
+            other = other.enode
+        return other is self.enode or other == self.enode
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+class _RecordingEnode(_WrappedEnode):
+
+    def __init__(self, enode):
+        super(_RecordingEnode, self).__init__(enode)
+        self.command = None
+
+    def __call__(self, command, shell=None):
+        self.command = command
+        raise _Deferred()
+
+
+class _ReplayingEnode(_WrappedEnode):
+
+    def __init__(self, enode, command, output):
+        super(_ReplayingEnode, self).__init__(enode)
+        self.command = command
+        self.output = output
+
+    def __call__(self, command, shell=None):
+        if self.command is None:
+            return self.enode(command, shell=shell)
+        expected, output = self.command, self.output
+        self.command, self.output = None, None
+        assert command == expected, \
+            "replay issued {!r} instead of the batched {!r}".format(
+                command, expected
+            )
+        return output
+
+
+class BatchCall(object):
+    """
+    Handle on the outcome of a queued library call.
+
+    :param function: the library function.
+    :param tuple args: positional arguments, engine node excluded.
+    :param dict kwargs: keyword arguments.
+    """
+
+    __slots__ = ('function', 'args', 'kwargs', 'command', 'value', 'error',
+                 'done')
+
+    def __init__(self, function, args, kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.command = None
+        self.value = None
+        self.error = None
+        self.done = False
+
+    def _run(self, enode):
+        try:
+            self.value = self.function(enode, *self.args, **self.kwargs)
+            assert not isgenerator(self.value), \
+                "{} returns a generator and cannot be batched".format(
+                    self.function.__name__
+                )
+        except Exception as error:
+            self.value = None
+            self.error = error
+        self.done = True
+
+    def result(self):
+        """
+        Return value of the call, raising its exception if it failed.
+        """
+
+        assert self.done, "batch has not been flushed yet"
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+    def __repr__(self):
+        if not self.done:
+            return 'BatchCall({}, pending)'.format(self.function.__name__)
+        if self.error is not None:
+            return 'BatchCall({}, error={!r})'.format(
+                self.function.__name__, self.error
+            )
+        return 'BatchCall({}, {!r})'.format(
+            self.function.__name__, self.value
+        )
+
+
+class Batch(object):
+    """
+    Queue of library calls against one engine node.
+
+    Every function in ``library.__all__`` is available as a method taking
+    the same arguments minus the engine node and returning a
+    :class:`BatchCall`.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param str shell: shell the merged script is run in.
+    """
+
+    def __init__(self, enode, shell='bash'):
+        self.enode = enode
+        self.shell = shell
+        self.pending = []
+
+    def call(self, function, *args, **kwargs):
+        """
+        Queue a library call.
+
+        :param function: name of a function in ``library.__all__``, or any
+            callable taking an engine node as first argument.
+        :rtype: BatchCall
+        :return: The handle completed by :meth:`flush`.
+        """
+
+        if not callable(function):
+            assert function in library.__all__, \
+                "{} is not a library function".format(function)
+            function = getattr(library, function)
+        assert function.__name__ not in UNBATCHABLE, \
+            "{} cannot be batched".format(function.__name__)
+        handle = BatchCall(function, args, kwargs)
+        self.pending.append(handle)
+        return handle
+
+    def script(self, handles, marker):
+        """
+        Build the shell script running the commands of the handles, each in
+        its own subshell and announced by a ``<marker><index>`` line.
+        """
+
+        steps = []
+        for index, handle in enumerate(handles):
+            steps.append('echo; echo "{}{}"; (\n{}\n)'.format(
+                marker, index, handle.command
+            ))
+        return '\n'.join(steps)
+
+    def flush(self):
+        """
+        Send the queued calls in one round trip and complete their handles.
+
+        :rtype: list
+        :return: The handles completed, in queue order.
+        """
+
+        handles, self.pending = self.pending, []
+
+        # Run every call up to its first command; calls answered without
+        # one, from the unit cache for instance, complete right away
+        queued = []
+        for handle in handles:
+            recorder = _RecordingEnode(self.enode)
+            try:
+                handle._run(recorder)
+            except _Deferred:
+                handle.command = recorder.command
+                queued.append(handle)
+
+        if queued:
+            marker = '@@{} '.format(uuid.uuid4().hex)
+            output = send(
+                self.enode, self.script(queued, marker), shell=self.shell
+            )
+            sections = split_sections(output, prefix=marker)
+            for index, handle in enumerate(queued):
+                lines = sections.get(str(index))
+                if lines is None:
+                    handle.error = AssertionError(
+                        "no output for batched command {!r}".format(
+                            handle.command
+                        )
+                    )
+                    handle.done = True
+                    continue
+                handle._run(_ReplayingEnode(
+                    self.enode, handle.command, '\n'.join(lines).rstrip('\n')
+                ))
+        return handles
+
+    def __getattr__(self, name):
+        if name not in library.__all__:
+            raise AttributeError(name)
+        return partial(self.call, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+
+__all__ = [
+    'UNBATCHABLE',
+    'BatchCall',
+    'Batch'
+]
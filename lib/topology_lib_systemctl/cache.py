@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Opt-in, per engine node cache of the systemd unit table.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import time
+from threading import Lock
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class UnitCache(object):
+    """
+    Time bounded cache of unit tables for one engine node.
+
+    Entries are keyed by the ``list-units`` output format and expire after
+    ``ttl`` seconds or as soon as :meth:`invalidate` is called.
+
+    :param float ttl: seconds a cached unit table stays valid.
+    """
+
+    def __init__(self, ttl=5.0):
+        assert ttl > 0, "ttl must be positive"
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        Return the cached unit table for the given key, or None if it is
+        missing or expired.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and _clock() - entry[0] < self.ttl:
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+            return None
+
+    def put(self, key, units):
+        """
+        Store a freshly fetched unit table.
+        """
+
+        with self._lock:
+            self._entries[key] = (_clock(), tuple(units))
+
+    def invalidate(self):
+        """
+        Drop every cached unit table.
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        :rtype: dict
+        :return: A dictionary with the ``hits``, ``misses``, ``ttl`` and
+            ``entries`` of the cache.
+        """
+
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'ttl': self.ttl,
+                'entries': len(self._entries)
+            }
+
+
+_caches = {}
+
+
+def get_cache(enode):
+    """
+    Return the unit cache enabled for the engine node, or None.
+    """
+
+    return _caches.get(enode)
+
+
+def enable_cache(enode, ttl=5.0):
+    """
+    Enable (or reconfigure) the unit cache of the engine node.
+    """
+
+    cache = _caches.get(enode)
+    if cache is None:
+        cache = _caches[enode] = UnitCache(ttl)
+    else:
+        cache.ttl = ttl
+    return cache
+
+
+def disable_cache(enode):
+    """
+    Disable the unit cache of the engine node and drop its contents.
+    """
+
+    _caches.pop(enode, None)
+
+
+__all__ = [
+    'UnitCache',
+    'get_cache',
+    'enable_cache',
+    'disable_cache'
+]
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Per unit cgroup resource accounting, for cgroup v2 and v1 hierarchies.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from collections import OrderedDict
+
+from .proc import split_sections
+
+
+#: Files read from the unit cgroup on the unified (v2) hierarchy.
+V2_FILES = ('memory.current', 'memory.stat', 'cpu.stat', 'io.stat')
+
+#: Files read on the legacy (v1) hierarchies, as ``<controller>/<file>``.
+V1_FILES = (
+    'memory/memory.usage_in_bytes', 'memory/memory.stat',
+    'cpuacct/cpuacct.usage', 'cpuacct/cpuacct.stat',
+    'blkio/blkio.throttle.io_service_bytes'
+)
+
+#: Clock ticks per second used by ``cpuacct.stat``.
+USER_HZ = 100
+
+#: Counters reported for every unit, all monotonic except ``memory``.
+FIELDS = (
+    'memory', 'cpu_usec', 'cpu_user_usec', 'cpu_system_usec',
+    'io_read_bytes', 'io_write_bytes'
+)
+
+
+def read_command(units):
+    """
+    Build the node-side command reading the cgroup files of the units.
+
+    :param list units: unit names.
+    :rtype: str
+    """
+
+    return (
+        "echo \"@@time $(date +%s.%N)\"; "
+        "for unit in {units}; do "
+        "cg=$(systemctl show -p ControlGroup $unit | cut -d= -f2); "
+        "if [ -f /sys/fs/cgroup/cgroup.controllers ]; then "
+        "echo \"@@unit $unit 2 $cg\"; "
+        "for file in {v2}; do "
+        "echo \"@@file $unit $file\"; "
+        "[ -n \"$cg\" ] && cat /sys/fs/cgroup$cg/$file 2>/dev/null; "
+        "done; "
+        "else "
+        "echo \"@@unit $unit 1 $cg\"; "
+        "for file in {v1}; do "
+        "echo \"@@file $unit $file\"; "
+        "[ -n \"$cg\" ] && "
+        "cat /sys/fs/cgroup/${{file%%/*}}$cg/${{file#*/}} 2>/dev/null; "
+        "done; "
+        "fi; "
+        "done"
+    ).format(
+        units=' '.join(units), v2=' '.join(V2_FILES), v1=' '.join(V1_FILES)
+    )
+
+
+def _keyed(lines):
+    values = OrderedDict()
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 2 and fields[1].isdigit():
+            values[fields[0]] = int(fields[1])
+    return values
+
+
+def _single(lines):
+    for line in lines:
+        if line.strip().isdigit():
+            return int(line)
+    return None
+
+
+def _io_v2(lines):
+    read = write = 0
+    for line in lines:
+        for field in line.split()[1:]:
+            key, _, value = field.partition('=')
+            if key == 'rbytes':
+                read += int(value)
+            elif key == 'wbytes':
+                write += int(value)
+    return read, write
+
+
+def _io_v1(lines):
+    read = write = 0
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 3 and fields[1] == 'Read':
+            read += int(fields[2])
+        elif len(fields) == 3 and fields[1] == 'Write':
+            write += int(fields[2])
+    return read, write
+
+
+def parse_usage(version, files):
+    """
+    Normalise the cgroup files of one unit.
+
+    :param int version: cgroup hierarchy version, 1 or 2.
+    :param dict files: mapping of file name to its lines.
+    :rtype: OrderedDict
+    :return: The :data:`FIELDS` values (bytes and microseconds, None when
+        not available), the ``memory_stat`` breakdown and the ``version``.
+    """
+
+    usage = OrderedDict((field, None) for field in FIELDS)
+    if version == 2:
+        usage['memory'] = _single(files.get('memory.current', []))
+        usage['memory_stat'] = _keyed(files.get('memory.stat', []))
+        cpu = _keyed(files.get('cpu.stat', []))
+        usage['cpu_usec'] = cpu.get('usage_usec')
+        usage['cpu_user_usec'] = cpu.get('user_usec')
+        usage['cpu_system_usec'] = cpu.get('system_usec')
+        if 'io.stat' in files:
+            usage['io_read_bytes'], usage['io_write_bytes'] = _io_v2(
+                files['io.stat']
+            )
+    else:
+        usage['memory'] = _single(
+            files.get('memory/memory.usage_in_bytes', [])
+        )
+        usage['memory_stat'] = _keyed(files.get('memory/memory.stat', []))
+        nanoseconds = _single(files.get('cpuacct/cpuacct.usage', []))
+        if nanoseconds is not None:
+            usage['cpu_usec'] = nanoseconds // 1000
+        ticks = _keyed(files.get('cpuacct/cpuacct.stat', []))
+        if 'user' in ticks:
+            usage['cpu_user_usec'] = ticks['user'] * 1000000 // USER_HZ
+        if 'system' in ticks:
+            usage['cpu_system_usec'] = ticks['system'] * 1000000 // USER_HZ
+        blkio = files.get('blkio/blkio.throttle.io_service_bytes')
+        if blkio is not None:
+            usage['io_read_bytes'], usage['io_write_bytes'] = _io_v1(blkio)
+    usage['version'] = version
+    return usage
+
+
+class CgroupReading(object):
+    """
+    Cgroup usage of a set of units at one point in time.
+
+    :param float timestamp: node time of the reading, in seconds.
+    :param OrderedDict units: mapping of unit to :func:`parse_usage` values.
+    """
+
+    __slots__ = ('timestamp', 'units')
+
+    def __init__(self, timestamp, units):
+        self.timestamp = timestamp
+        self.units = units
+
+    @classmethod
+    def parse(cls, output):
+        """
+        Build a reading from the output of :func:`read_command`.
+        """
+
+        timestamp = None
+        versions = OrderedDict()
+        files = {}
+        for name, lines in split_sections(output).items():
+            fields = name.split()
+            if fields[0] == 'time' and len(fields) == 2:
+                timestamp = float(fields[1])
+            elif fields[0] == 'unit' and len(fields) >= 3:
+                versions[fields[1]] = int(fields[2])
+                files[fields[1]] = {}
+            elif fields[0] == 'file' and len(fields) == 3:
+                if lines and fields[1] in files:
+                    files[fields[1]][fields[2]] = lines
+        return cls(timestamp, OrderedDict(
+            (unit, parse_usage(version, files[unit]))
+            for unit, version in versions.items()
+        ))
+
+    def rates(self, later):
+        """
+        Compute the usage rates between this reading and a later one.
+
+        :param CgroupReading later: the later reading.
+        :rtype: OrderedDict
+        :return: A dictionary mapping each unit to the ``interval`` in
+            seconds, the ``memory`` delta in bytes, the ``cpu_percent`` of
+            one core used, and the ``io_read_rate`` and ``io_write_rate`` in
+            bytes per second. Values are None when a counter is missing.
+        """
+
+        interval = later.timestamp - self.timestamp
+        assert interval > 0, "readings must be taken in order"
+
+        def delta(before, after, field):
+            if before.get(field) is None or after.get(field) is None:
+                return None
+            return after[field] - before[field]
+
+        rates = OrderedDict()
+        for unit, after in later.units.items():
+            before = self.units.get(unit)
+            if before is None:
+                continue
+            cpu = delta(before, after, 'cpu_usec')
+            read = delta(before, after, 'io_read_bytes')
+            write = delta(before, after, 'io_write_bytes')
+            rates[unit] = OrderedDict([
+                ('interval', interval),
+                ('memory', delta(before, after, 'memory')),
+                ('cpu_percent',
+                 None if cpu is None else cpu / (interval * 1e4)),
+                ('io_read_rate', None if read is None else read / interval),
+                ('io_write_rate',
+                 None if write is None else write / interval),
+            ])
+        return rates
+
+
+__all__ = [
+    'V2_FILES',
+    'V1_FILES',
+    'USER_HZ',
+    'FIELDS',
+    'read_command',
+    'parse_usage',
+    'CgroupReading'
+]
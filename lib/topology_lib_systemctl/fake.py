@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Replaying engine node for offline tests and benchmarks.
+
+:class:`ReplayEnode` answers the commands issued by the library with
+synthetic, but well formed, ``systemctl``, ``/proc`` and signal outputs for
+a node of the configured size, optionally after a simulated round trip
+latency.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import re
+import json
+import time
+
+
+_LOOP = re.compile(r'for (\w+) in ([^;]*); do')
+
+_BATCH = re.compile(r'^echo; echo "(@@\w+ \d+)"; \(\n(.*?)\n\)$', re.M | re.S)
+
+_STATES = {'KILL': '', 'TERM': '', 'STOP': 'T', 'CONT': 'S'}
+
+
+class ReplayEnode(object):
+    """
+    Engine node double replaying canned outputs.
+
+    Unit ``unit-<n>.service`` is failed for every tenth unit and not found
+    for every seventh one; all other units are active and running.
+
+    :param float latency: seconds slept on every call, to simulate the
+        transport round trip.
+    :param int units: number of units in the unit table.
+    :param int cores: number of CPU cores in ``/proc/stat``.
+
+    :attr:`round_trips` counts the calls and :attr:`reply_time` the seconds
+    spent building the outputs, simulated latency excluded.
+    """
+
+    def __init__(self, latency=0.0, units=100, cores=4):
+        self.latency = latency
+        self.units = units
+        self.cores = cores
+        self.round_trips = 0
+        self.reply_time = 0.0
+        self.commands = []
+        self._ticks = 0
+        self._tables = {}
+
+    def __call__(self, command, shell=None):
+        self.round_trips += 1
+        self.commands.append(command)
+        if self.latency:
+            time.sleep(self.latency)
+        start = time.time()
+        # Engine nodes strip the trailing newline of the command output
+        output = self.reply(command).rstrip('\n')
+        self.reply_time += time.time() - start
+        return output
+
+    def reset(self):
+        """
+        Forget the commands received so far.
+        """
+
+        self.round_trips = 0
+        self.reply_time = 0.0
+        del self.commands[:]
+
+    def unit_rows(self):
+        """
+        Yield the (name, load, active, sub, description) rows of the unit
+        table.
+        """
+
+        for index in range(self.units):
+            name = 'unit-{}.service'.format(index)
+            if index % 10 == 9:
+                yield name, 'loaded', 'failed', 'failed', 'Failing unit'
+            elif index % 7 == 6:
+                yield name, 'not-found', 'inactive', 'dead', name
+            else:
+                yield name, 'loaded', 'active', 'running', 'Replayed unit'
+
+    def list_units(self, as_json=False):
+        """
+        Output of ``systemctl list-units``, built once per format.
+        """
+
+        table = self._tables.get(as_json)
+        if table is not None:
+            return table
+        if as_json:
+            table = json.dumps([
+                dict(zip(('unit', 'load', 'active', 'sub', 'description'),
+                         row))
+                for row in self.unit_rows()
+            ])
+        else:
+            table = '\n'.join(' '.join(row) for row in self.unit_rows())
+        self._tables[as_json] = table
+        return table
+
+    def stat(self):
+        """
+        Content of ``/proc/stat``; counters advance on every read.
+        """
+
+        self._ticks += 100
+        ticks = self._ticks
+        lines = ['cpu  {0} 0 {1} {2} {1} 0 0 0'.format(
+            ticks * self.cores // 2, ticks * self.cores // 10,
+            ticks * self.cores // 4
+        )]
+        for core in range(self.cores):
+            lines.append('cpu{0} {1} 0 {2} {3} {2} 0 0 0'.format(
+                core, ticks // 2, ticks // 10, ticks // 4
+            ))
+        lines.append('intr 0')
+        return '\n'.join(lines) + '\n'
+
+    def meminfo(self):
+        """
+        Content of ``/proc/meminfo``.
+        """
+
+        return (
+            'MemTotal:        2048000 kB\n'
+            'MemFree:          512000 kB\n'
+            'MemAvailable:    1024000 kB\n'
+            'Buffers:           64000 kB\n'
+            'Cached:           256000 kB\n'
+            'SReclaimable:      32000 kB\n'
+        )
+
+    def show(self, command):
+        """
+        Output of ``systemctl show`` for the units in the command.
+        """
+
+        tokens = command.split()
+        units = []
+        skip = True
+        for token in tokens[tokens.index('show') + 1:]:
+            if token == '-p':
+                skip = True
+            elif skip:
+                skip = False
+            else:
+                units.append(token)
+        return '\n\n'.join(
+            'Id={}\nActiveState=active\nSubState=running'.format(unit)
+            for unit in units
+        ) + '\n'
+
+    def reply(self, command):
+        """
+        Build the output of a command.
+        """
+
+        steps = _BATCH.findall(command)
+        if steps:
+            return ''.join(
+                '\n{}\n{}\n'.format(marker, self.reply(step).rstrip('\n'))
+                for marker, step in steps
+            )
+        loops = dict(
+            (variable, values.split())
+            for variable, values in _LOOP.findall(command)
+        )
+        if 'systemctl list-units' in command:
+            return self.list_units('--output=json' in command)
+        if command.startswith('systemctl show'):
+            return self.show(command)
+        if '@@restart' in command:
+            return ''.join(
+                '@@restart {} 0 1000000000 1001000000\n'.format(unit)
+                for unit in loops.get('unit', [])
+            )
+        if 'daemon' in loops and 'kill -' in command:
+            signal = re.search(r'kill -(\w+) \$pids', command).group(1)
+            lines = []
+            for index, daemon in enumerate(loops['daemon']):
+                pid = 1000 + index
+                lines.append('@@pids {} {}'.format(daemon, pid))
+                lines.append('@@sent {} 0'.format(daemon))
+                lines.append('@@state {} {} {}'.format(
+                    daemon, pid, _STATES.get(signal, 'S')
+                ))
+            return '\n'.join(lines) + '\n'
+        if '@@before' in command:
+            return '@@before\n{}@@after\n{}'.format(self.stat(), self.stat())
+        if '@@meminfo' in command:
+            return '@@stat\n{}@@meminfo\n{}'.format(
+                self.stat(), self.meminfo()
+            )
+        if 'cat /proc/stat' in command:
+            return self.stat()
+        if 'cat /proc/meminfo' in command:
+            return self.meminfo()
+        return ''
+
+
+__all__ = [
+    'ReplayEnode'
+]
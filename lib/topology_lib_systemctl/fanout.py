@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Run library functions against many engine nodes concurrently.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from . import library
+
+
+class NodeResult(object):
+    """
+    Outcome of one library call on one engine node.
+
+    :param value: the return value, or None if the call raised.
+    :param Exception error: the raised exception, or None.
+    :param float elapsed: seconds spent in the call.
+    """
+
+    __slots__ = ('value', 'error', 'elapsed')
+
+    def __init__(self, value=None, error=None, elapsed=0.0):
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        """
+        Whether the call returned without raising.
+        """
+
+        return self.error is None
+
+    def __repr__(self):
+        if self.error is not None:
+            return 'NodeResult(error={!r})'.format(self.error)
+        return 'NodeResult({!r})'.format(self.value)
+
+
+class FanOutReport(object):
+    """
+    Per node results of a :func:`fan_out` call, in input order.
+
+    :param OrderedDict results: mapping of node key to :class:`NodeResult`.
+    :param float elapsed: wall clock seconds of the whole fan-out.
+    """
+
+    def __init__(self, results, elapsed):
+        self.results = results
+        self.elapsed = elapsed
+
+    @property
+    def serial_time(self):
+        """
+        Sum of the per node call times, that is what running the nodes one
+        after the other would have cost.
+        """
+
+        return sum(result.elapsed for result in self.results.values())
+
+    @property
+    def failed(self):
+        """
+        Mapping of node key to exception for the calls that raised.
+        """
+
+        return OrderedDict(
+            (key, result.error) for key, result in self.results.items()
+            if result.error is not None
+        )
+
+    def values(self):
+        """
+        Mapping of node key to return value; raises the first error found.
+        """
+
+        for result in self.results.values():
+            if result.error is not None:
+                raise result.error
+        return OrderedDict(
+            (key, result.value) for key, result in self.results.items()
+        )
+
+
+def _resolve(function):
+    if callable(function):
+        return function
+    assert function in library.__all__, \
+        "{} is not a library function".format(function)
+    return getattr(library, function)
+
+
+def _timed_call(function, enode, args, kwargs):
+    start = time.time()
+    try:
+        value = function(enode, *args, **kwargs)
+    except Exception as error:
+        return NodeResult(error=error, elapsed=time.time() - start)
+    return NodeResult(value=value, elapsed=time.time() - start)
+
+
+def fan_out(function, enodes, args=(), kwargs=None, max_workers=8):
+    """
+    Call a library function against every engine node on a bounded thread
+    pool.
+
+    Exceptions are captured per node instead of aborting the sweep.
+
+    ::
+
+        report = fan_out('check_failed_services', {'sw1': sw1, 'sw2': sw2})
+        failed = report.values()
+
+    :param function: name of a function in ``library.__all__``, or any
+        callable taking an engine node as first argument.
+    :param enodes: list of engine nodes, or mapping of name to engine node.
+    :param tuple args: extra positional arguments for every call.
+    :param dict kwargs: extra keyword arguments for every call.
+    :param int max_workers: maximum number of nodes called at once.
+    :rtype: FanOutReport
+    :return: The per node results keyed by node name, or by engine node if
+        a list was given, in input order.
+    """
+
+    assert max_workers > 0, "max_workers must be positive"
+    function = _resolve(function)
+    kwargs = kwargs or {}
+    if hasattr(enodes, 'items'):
+        targets = list(enodes.items())
+    else:
+        targets = [(enode, enode) for enode in enodes]
+
+    start = time.time()
+    workers = max(1, min(max_workers, len(targets)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            (key, executor.submit(_timed_call, function, enode, args, kwargs))
+            for key, enode in targets
+        ]
+        results = OrderedDict(
+            (key, future.result()) for key, future in futures
+        )
+    return FanOutReport(results, time.time() - start)
+
+
+__all__ = [
+    'NodeResult',
+    'FanOutReport',
+    'fan_out'
+]
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Opt-in instrumentation of the enode commands issued by the library.
+
+Every command the library sends goes through :func:`send`. While an
+:class:`Instrumentation` is enabled, each call is timed and recorded under
+the public library function that issued it::
+
+    with instrumented() as instrumentation:
+        run_test_suite()
+    for function, stats in instrumentation.summary().items():
+        print(function, stats['calls'], stats['total'], stats['p95'])
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import sys
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from threading import Lock
+
+
+_clock = getattr(time, 'monotonic', time.time)
+
+_LIBRARY = __name__.rpartition('.')[0] + '.library'
+
+#: Upper bounds, in seconds, of the latency histogram buckets (1 ms to
+#: about 65 s, doubling). Slower calls land in an overflow bucket.
+BUCKETS = tuple(0.001 * 2 ** exponent for exponent in range(17))
+
+
+class CommandRecord(object):
+    """
+    One enode command issued by the library.
+
+    :param str function: library function that issued the command.
+    :param str command: the command sent.
+    :param float latency: seconds until the enode returned.
+    :param int output_size: length of the output, 0 if the call raised.
+    :param Exception error: exception raised by the enode, or None.
+    """
+
+    __slots__ = ('function', 'command', 'latency', 'output_size', 'error')
+
+    def __init__(self, function, command, latency, output_size, error=None):
+        self.function = function
+        self.command = command
+        self.latency = latency
+        self.output_size = output_size
+        self.error = error
+
+    def __repr__(self):
+        return 'CommandRecord({!r}, {:.6f})'.format(
+            self.function, self.latency
+        )
+
+
+class LatencyHistogram(object):
+    """
+    Logarithmic latency histogram of the calls of one function.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.calls = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.output_size = 0
+
+    def add(self, latency, output_size=0):
+        """
+        Account for one call.
+        """
+
+        index = 0
+        while index < len(BUCKETS) and latency > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.calls += 1
+        self.total += latency
+        self.output_size += output_size
+        if self.minimum is None or latency < self.minimum:
+            self.minimum = latency
+        if self.maximum is None or latency > self.maximum:
+            self.maximum = latency
+
+    def percentile(self, fraction):
+        """
+        Upper bound of the bucket holding the given fraction of the calls.
+
+        The overflow bucket reports the maximum latency seen.
+        """
+
+        if not self.calls:
+            return None
+        target = fraction * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def stats(self):
+        """
+        Summary of the histogram as a dictionary.
+        """
+
+        return OrderedDict([
+            ('calls', self.calls),
+            ('total', self.total),
+            ('mean', self.total / self.calls if self.calls else None),
+            ('min', self.minimum),
+            ('max', self.maximum),
+            ('p50', self.percentile(0.5)),
+            ('p95', self.percentile(0.95)),
+            ('output_size', self.output_size),
+        ])
+
+
+class Instrumentation(object):
+    """
+    Collect per function latency histograms of the enode commands.
+
+    :param sink: callable receiving every :class:`CommandRecord`, for
+        example to forward it to a metrics system.
+    :param int keep: number of most recent records kept in memory in
+        :attr:`records`; 0 keeps none.
+    """
+
+    def __init__(self, sink=None, keep=1000):
+        self.sink = sink
+        self.records = deque(maxlen=keep)
+        self.histograms = {}
+        self._lock = Lock()
+
+    def call(self, enode, command, shell, function):
+        """
+        Send a command through the enode and record it.
+        """
+
+        start = _clock()
+        try:
+            output = enode(command, shell=shell)
+        except Exception as error:
+            self.record(CommandRecord(
+                function, command, _clock() - start, 0, error
+            ))
+            raise
+        self.record(CommandRecord(
+            function, command, _clock() - start, len(output or '')
+        ))
+        return output
+
+    def record(self, record):
+        """
+        Account for a command record and hand it to the sink.
+        """
+
+        with self._lock:
+            histogram = self.histograms.get(record.function)
+            if histogram is None:
+                histogram = self.histograms[record.function] = \
+                    LatencyHistogram()
+            histogram.add(record.latency, record.output_size)
+            if self.records.maxlen:
+                self.records.append(record)
+        if self.sink is not None:
+            self.sink(record)
+
+    def summary(self):
+        """
+        Per function statistics, the functions with the largest total
+        latency first.
+
+        :rtype: OrderedDict
+        :return: A dictionary mapping each function to the ``calls``,
+            ``total``, ``mean``, ``min``, ``max``, ``p50`` and ``p95``
+            latencies (seconds) and total ``output_size`` of its commands.
+        """
+
+        with self._lock:
+            stats = [
+                (function, histogram.stats())
+                for function, histogram in self.histograms.items()
+            ]
+        stats.sort(key=lambda item: item[1]['total'], reverse=True)
+        return OrderedDict(stats)
+
+    def reset(self):
+        """
+        Drop every record and histogram.
+        """
+
+        with self._lock:
+            self.records.clear()
+            self.histograms.clear()
+
+
+_active = None
+
+
+def enable(instrumentation=None, sink=None, keep=1000):
+    """
+    Start instrumenting the library commands.
+
+    :param Instrumentation instrumentation: collector to use; a new one
+        built with ``sink`` and ``keep`` if not given.
+    :rtype: Instrumentation
+    """
+
+    global _active
+    if instrumentation is None:
+        instrumentation = Instrumentation(sink=sink, keep=keep)
+    _active = instrumentation
+    return instrumentation
+
+
+def disable():
+    """
+    Stop instrumenting the library commands.
+    """
+
+    global _active
+    _active = None
+
+
+def active():
+    """
+    Return the enabled :class:`Instrumentation`, or None.
+    """
+
+    return _active
+
+
+@contextmanager
+def instrumented(sink=None, keep=1000):
+    """
+    Instrument the library commands for the duration of a ``with`` block.
+    """
+
+    instrumentation = enable(sink=sink, keep=keep)
+    try:
+        yield instrumentation
+    finally:
+        disable()
+
+
+def _caller():
+    """
+    Name of the outermost library function in the calling stack, or of the
+    direct caller of :func:`send` outside of the library.
+    """
+
+    frame = sys._getframe(2)
+    name = frame.f_code.co_name
+    while frame is not None:
+        if frame.f_globals.get('__name__') == _LIBRARY:
+            name = frame.f_code.co_name
+        frame = frame.f_back
+    return name
+
+
+def send(enode, command, shell='bash'):
+    """
+    Send a command through the enode, recording it if instrumentation is
+    enabled.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param str command: the command to send.
+    :param str shell: the shell to run it in.
+    :rtype: str
+    :return: The command output.
+    """
+
+    instrumentation = _active
+    if instrumentation is None:
+        return enode(command, shell=shell)
+    return instrumentation.call(enode, command, shell, _caller())
+
+
+__all__ = [
+    'BUCKETS',
+    'CommandRecord',
+    'LatencyHistogram',
+    'Instrumentation',
+    'enable',
+    'disable',
+    'active',
+    'instrumented',
+    'send'
+]
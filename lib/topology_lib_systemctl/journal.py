@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Incremental journal reading with per engine node cursors.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import json
+
+
+class JournalRecord(object):
+    """
+    One journal entry, as printed by ``journalctl --output=json``.
+
+    :param dict fields: the JSON fields of the entry.
+    """
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    @property
+    def cursor(self):
+        """
+        Journal cursor of the entry.
+        """
+
+        return self.fields.get('__CURSOR')
+
+    @property
+    def timestamp(self):
+        """
+        Wall clock time of the entry, in seconds since the epoch.
+        """
+
+        value = self.fields.get('__REALTIME_TIMESTAMP')
+        return int(value) / 1e6 if value is not None else None
+
+    @property
+    def unit(self):
+        """
+        Unit that logged the entry.
+        """
+
+        return self.fields.get('_SYSTEMD_UNIT') or self.fields.get('UNIT')
+
+    @property
+    def priority(self):
+        """
+        syslog priority of the entry, from 0 (emerg) to 7 (debug).
+        """
+
+        value = self.fields.get('PRIORITY')
+        return int(value) if value is not None else None
+
+    @property
+    def message(self):
+        """
+        Message of the entry. Non UTF-8 messages, which journald exports as
+        arrays of bytes, are decoded with replacement characters.
+        """
+
+        value = self.fields.get('MESSAGE')
+        if isinstance(value, list):
+            return bytearray(value).decode('utf-8', 'replace')
+        return value
+
+    def __repr__(self):
+        return 'JournalRecord({!r}, {!r})'.format(self.unit, self.message)
+
+
+def parse_records(output):
+    """
+    Lazily parse the output of ``journalctl --output=json``.
+
+    Lines that are not JSON objects, such as the echoed command, are
+    skipped.
+
+    :param str output: raw command output.
+    :rtype: generator
+    :return: A generator of :class:`JournalRecord`.
+    """
+
+    for line in output.splitlines():
+        line = line.strip()
+        if not line.startswith('{'):
+            continue
+        yield JournalRecord(json.loads(line))
+
+
+_cursors = {}
+
+
+def get_cursor(enode, units):
+    """
+    Return the cursor of the last entry read for the units, or None.
+    """
+
+    return _cursors.get(enode, {}).get(tuple(sorted(units)))
+
+
+def set_cursor(enode, units, cursor):
+    """
+    Remember the cursor of the last entry read for the units.
+    """
+
+    _cursors.setdefault(enode, {})[tuple(sorted(units))] = cursor
+
+
+def reset_cursors(enode):
+    """
+    Forget every cursor of the engine node.
+    """
+
+    _cursors.pop(enode, None)
+
+
+__all__ = [
+    'JournalRecord',
+    'parse_records',
+    'get_cursor',
+    'set_cursor',
+    'reset_cursors'
+]
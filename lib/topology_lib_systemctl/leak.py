@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Trend based memory leak detection over a series of ``/proc/meminfo``
+samples.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from operator import mul, sub
+
+
+#: Reclaimable memory subtracted from MemTotal when MemAvailable is missing.
+_RECLAIMABLE = ('MemFree', 'Buffers', 'Cached', 'SReclaimable')
+
+
+def used_memory(meminfo):
+    """
+    Memory in use, in kB, that the kernel cannot reclaim.
+
+    MemAvailable is used when the kernel reports it (3.14+); otherwise the
+    free, buffer, page cache and reclaimable slab memory is subtracted.
+
+    >>> used_memory({'MemTotal': 1000, 'MemAvailable': 600})
+    400
+    >>> used_memory({'MemTotal': 1000, 'MemFree': 300, 'Cached': 200})
+    500
+
+    :param dict meminfo: parsed ``/proc/meminfo`` values.
+    :rtype: int
+    """
+
+    if 'MemAvailable' in meminfo:
+        return meminfo['MemTotal'] - meminfo['MemAvailable']
+    return meminfo['MemTotal'] - sum(
+        meminfo.get(field, 0) for field in _RECLAIMABLE
+    )
+
+
+def fit_trend(times, values):
+    """
+    Least squares fit of a line through the given points.
+
+    The sums are computed with ``map`` over C level operators instead of a
+    Python loop per sample.
+
+    >>> fit_trend([0, 1, 2, 3], [10, 12, 14, 16])
+    (2.0, 1.0)
+
+    :param list times: sample times, in seconds.
+    :param list values: sample values.
+    :rtype: tuple
+    :return: The slope (value units per second) and the coefficient of
+        determination (r squared, between 0 and 1) of the fit.
+    """
+
+    count = len(times)
+    assert count == len(values), "times and values differ in length"
+    assert count >= 2, "at least two samples are required"
+
+    mean_t = sum(times) / count
+    mean_v = sum(values) / count
+    dt = list(map(sub, times, [mean_t] * count))
+    dv = list(map(sub, values, [mean_v] * count))
+    sxx = sum(map(mul, dt, dt))
+    sxy = sum(map(mul, dt, dv))
+    syy = sum(map(mul, dv, dv))
+
+    assert sxx > 0, "samples must span a time interval"
+    slope = sxy / sxx
+    if syy == 0:
+        return slope, 0.0
+    return slope, (sxy * sxy) / (sxx * syy)
+
+
+def detect_leak(samples, rate_threshold, min_confidence=0.9):
+    """
+    Decide whether the used memory of a sample series grows steadily.
+
+    :param list samples: :class:`topology_lib_systemctl.proc.Sample` objects
+        with ``meminfo`` values, in any order.
+    :param float rate_threshold: growth rate, in kB per second, above which
+        the series is considered leaking.
+    :param float min_confidence: minimum r squared of the fit for the growth
+        to be trusted.
+    :rtype: dict
+    :return: A dictionary with the fitted ``rate`` (kB/s), the ``growth``
+        (kB) over the sampled span, the ``confidence`` of the fit, the number
+        of ``samples``, the ``span`` (seconds) and a ``verdict`` of 1 for a
+        leak and 0 otherwise.
+    """
+
+    ordered = sorted(samples, key=lambda sample: sample.timestamp)
+    start = ordered[0].timestamp if ordered else 0.0
+    times = [sample.timestamp - start for sample in ordered]
+    values = [used_memory(sample.meminfo) for sample in ordered]
+
+    rate, confidence = fit_trend(times, values)
+    span = times[-1]
+    leaking = rate > rate_threshold and confidence >= min_confidence
+    return {
+        'rate': rate,
+        'growth': rate * span,
+        'confidence': confidence,
+        'samples': len(ordered),
+        'span': span,
+        'verdict': 1 if leaking else 0
+    }
+
+
+__all__ = [
+    'used_memory',
+    'fit_trend',
+    'detect_leak'
+]
@@ -22,31 +22,224 @@ topology_lib_systemctl communication library implementation.
 from __future__ import unicode_literals, absolute_import
 from __future__ import print_function, division
 import time
+from collections import OrderedDict
+
+from . import cache, journal
+from .pressure import (
+    PressureReading, exceeded, read_command as pressure_read_command
+)
+from .cgroup import CgroupReading, read_command as cgroup_read_command
+from .analyze import (
+    BootAnalysis, parse_time, parse_blame, parse_critical_chain
+)
+from .instrument import send as _send
+from .leak import detect_leak
+from .load import CpuLoad, start_command, stop_command
+from .properties import DEFAULT_PROPERTIES, UnitProperties
+from .restart import DEPENDENCY_PROPERTIES, plan_restart
+from .proc import (
+    Sample, split_sections, parse_stat, parse_meminfo, parse_pid_stat,
+    cpu_utilisation
+)
+from .sampler import ResourceSampler
+from .triage import parse_triage, triage_command
+from .agent import SamplingAgent
+from .units import (
+    UnitSnapshot, parse_units_plain, parse_units_json, parse_show
+)
+
+_clock = getattr(time, 'monotonic', time.time)
 
 # Add your library functions here.
 
 
-def check_failed_services(enode):
+def _marker_fields(output, tag):
+    """
+    Yield the fields of every ``@@<tag>`` marker line found in the output of a
+    node-side script.
+
+    Marker lines let a single enode call report several results; lines that
+    do not start with the marker, such as the echoed command, are ignored.
+    """
+
+    prefix = '@@' + tag + ' '
+    for line in output.splitlines():
+        line = line.rstrip('\r')
+        if line.startswith(prefix):
+            yield line[len(prefix):].split()
+
+
+def list_units(enode, output='plain'):
     '''
-    List the failed services
+    Fetch the full unit table, including inactive units, in one enode call
+
+    The returned records carry the load, active and sub state of each unit,
+    so a single call can be filtered to answer :func:`list_all_units`,
+    :func:`list_loaded_units` and :func:`check_failed_services` by passing it
+    as their ``units`` argument.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param str output: ``plain`` to parse the plain table or ``json`` to use
+        ``--output=json`` on nodes whose systemd supports it (v246+).
 
     :rtype: list
-    :return: The list of failed services or None
+    :return: The list of :class:`topology_lib_systemctl.units.Unit` records
+    '''
+
+    assert output in ('plain', 'json'), "invalid output format"
+    unit_cache = cache.get_cache(enode)
+    if unit_cache is not None:
+        units = unit_cache.get(output)
+        if units is not None:
+            return units
+
+    cmd = "systemctl list-units --all --full --no-legend --no-pager"
+    if output == 'json':
+        units = parse_units_json(
+            _send(enode, cmd + " --output=json", shell='bash')
+        )
+    else:
+        units = parse_units_plain(
+            _send(enode, cmd + " --plain", shell='bash')
+        )
+
+    if unit_cache is not None:
+        unit_cache.put(output, units)
+    return units
+
+
+def take_unit_snapshot(enode, restarts=False):
+    '''
+    Take a snapshot of the unit table, indexed by unit name
+
+    Two snapshots are compared with their ``diff()`` method, which reports
+    the added and removed units, the state transitions (for example active
+    to failed) and, when restart counts were taken, the restarted services.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param bool restarts: also fetch the NRestarts of every loaded service,
+        with a second enode call.
+
+    :rtype: topology_lib_systemctl.units.UnitSnapshot
+    :return: The snapshot
+    '''
+
+    timestamp = time.time()
+    units = list_units(enode)
+    counts = None
+    if restarts:
+        services = [
+            unit.name for unit in units
+            if unit.load == 'loaded' and unit.name.endswith('.service')
+        ]
+        counts = {}
+        if services:
+            props = get_unit_properties(enode, services, ('NRestarts',))
+            counts = dict(
+                (name, record.get('NRestarts'))
+                for name, record in props.items()
+            )
+    return UnitSnapshot(units, counts, timestamp)
+
+
+def enable_unit_cache(enode, ttl=5.0):
+    '''
+    Cache the unit table of the node for the given number of seconds
+
+    While enabled, :func:`list_units` and the listing functions built on it
+    answer from the cache. Mutating functions such as
+    :func:`reload_service_units` and :func:`kill_daemons` invalidate it.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param float ttl: seconds a cached unit table stays valid.
     '''
 
-    cmd = ("systemctl list-units -all --state=failed | grep failed | " +
-           "awk '{print $2;}'")
-    output = enode(cmd, shell='bash')
-    output = output.split('\n')
+    cache.enable_cache(enode, ttl)
 
-    retval = []
-    for line in output:
-        if "systemctl list-units" not in line:
-            retval.append(line)
-    if retval is "":
+
+def disable_unit_cache(enode):
+    '''
+    Stop caching the unit table of the node
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    '''
+
+    cache.disable_cache(enode)
+
+
+def invalidate_unit_cache(enode):
+    '''
+    Drop the cached unit table of the node, if caching is enabled
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    '''
+
+    unit_cache = cache.get_cache(enode)
+    if unit_cache is not None:
+        unit_cache.invalidate()
+
+
+def unit_cache_stats(enode):
+    '''
+    Report the unit cache counters of the node
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+
+    :rtype: dict
+    :return: The ``hits``, ``misses``, ``ttl`` and ``entries`` of the cache,
+        or None if caching is not enabled
+    '''
+
+    unit_cache = cache.get_cache(enode)
+    if unit_cache is None:
         return None
-    else:
-        return retval
+    return unit_cache.stats()
+
+
+def check_failed_services(enode, units=None):
+    '''
+    List the failed services
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list units: unit records previously returned by
+        :func:`list_units`. If not given, they are fetched from the node.
+
+    :rtype: list
+    :return: The list of failed services
+    '''
+
+    if units is None:
+        units = list_units(enode)
+    return [unit.name for unit in units if unit.active == 'failed']
+
+
+def triage_failed_units(enode, lines=20):
+    '''
+    Collect why every failed unit failed, in one enode call
+
+    For each failed unit, its Result, ExecMainCode, ExecMainStatus,
+    NRestarts, the time it entered the failed state and its ``lines``
+    latest journal entries are gathered by a single node-side command.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param int lines: journal entries collected per unit.
+
+    :rtype: OrderedDict
+    :return: A dictionary mapping each failed unit name to its
+        :class:`topology_lib_systemctl.triage.FailedUnit`. Its
+        ``summary()`` method gives a one line description of the failure.
+    '''
+
+    assert lines >= 0, "lines must not be negative"
+    return parse_triage(_send(enode, triage_command(lines), shell='bash'))
 
 
 def get_memory_usage(enode):
@@ -59,7 +252,7 @@ def get_memory_usage(enode):
     """
 
     mem_info = {}
-    output = enode("cat /proc/meminfo", shell="bash")
+    output = _send(enode, "cat /proc/meminfo", shell="bash")
     assert 'MemTotal' in output
     buffer1 = output.split('\n')
 
@@ -110,18 +303,170 @@ def memory_leak_check(enode, init_val, final_val, leakage_threshold):
     return verdict
 
 
-def get_cpu_usage(enode):
+def collect_memory_samples(enode, count, interval):
+    """
+    This function reads the full /proc/meminfo file ``count`` times,
+        ``interval`` seconds apart, in a single node-side command.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param int count: number of samples to take.
+    :param float interval: seconds between two samples.
+
+    :rtype: list
+    :return: The list of :class:`topology_lib_systemctl.proc.Sample`
+        objects, timestamped by the node clock.
+    """
+
+    assert count >= 2, "at least two samples are required"
+    cmd = (
+        "for i in $(seq {count}); do "
+        "echo \"@@sample $(date +%s.%N)\"; cat /proc/meminfo; "
+        "[ $i -lt {count} ] && sleep {interval}; "
+        "done"
+    ).format(count=int(count), interval=interval)
+    output = _send(enode, cmd, shell="bash")
+
+    samples = []
+    for name, lines in split_sections(output).items():
+        timestamp = name.split()[-1]
+        samples.append(Sample(float(timestamp), meminfo=parse_meminfo(lines)))
+    return samples
+
+
+def memory_leak_trend(enode, samples, rate_threshold, min_confidence=0.9):
+    """
+    This function fits the growth of the used memory over a series of
+        samples and compares it with a growth rate threshold, which is far
+        less sensitive to page cache and slab churn than
+        :func:`memory_leak_check`.
+
+    Used memory is MemTotal minus MemAvailable, or minus MemFree, Buffers,
+        Cached and SReclaimable on kernels without MemAvailable.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list samples: samples returned by :func:`collect_memory_samples`
+        or taken by a :class:`topology_lib_systemctl.sampler.ResourceSampler`.
+    :param float rate_threshold: growth rate, in kB per second, beyond which
+        the memory is considered leaking.
+    :param float min_confidence: minimum coefficient of determination of the
+        fit for the growth to be trusted.
+
+    :rtype: dict
+    :return: The ``rate`` (kB/s), ``growth`` (kB), ``confidence``,
+        ``samples``, ``span`` (seconds) and ``verdict`` (1 for leakage
+        detection and 0 for no leakage)
+    """
+
+    return detect_leak(samples, rate_threshold, min_confidence)
+
+
+def get_daemons_usage(enode, daemons_list):
+    """
+    This function resolves the PIDs of every daemon in the list and reads
+        their /proc/<pid>/status, /proc/<pid>/stat and
+        /proc/<pid>/smaps_rollup files in a single node-side command.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list daemons_list: This is the list of daemons to account for.
+
+    :rtype: OrderedDict
+    :return: A dictionary mapping each daemon to a dictionary with its
+        ``pids`` and, summed over them, ``rss``, ``pss`` and ``swap`` (kB),
+        ``threads``, ``utime`` and ``stime`` (clock ticks). ``pss`` is None
+        on kernels without smaps_rollup (before 4.14).
+    """
+
+    assert len(daemons_list) > 0, "empty daemons list"
+    for daemon in daemons_list:
+        assert daemon, "null daemon name"
+
+    cmd = (
+        "for daemon in {daemons}; do "
+        "echo \"@@daemon $daemon\"; "
+        "for pid in $(pidof $daemon); do "
+        "echo \"@@status $daemon $pid\"; cat /proc/$pid/status 2>/dev/null; "
+        "echo \"@@stat $daemon $pid\"; cat /proc/$pid/stat 2>/dev/null; "
+        "echo \"@@smaps $daemon $pid\"; "
+        "cat /proc/$pid/smaps_rollup 2>/dev/null; "
+        "done; done"
+    ).format(daemons=" ".join(daemons_list))
+    sections = split_sections(_send(enode, cmd, shell="bash"))
+
+    usage = OrderedDict(
+        (daemon, {
+            'pids': [], 'rss': 0, 'pss': None, 'swap': 0, 'threads': 0,
+            'utime': 0, 'stime': 0
+        })
+        for daemon in daemons_list
+    )
+    for name, lines in sections.items():
+        fields = name.split()
+        if len(fields) != 3 or fields[1] not in usage:
+            continue
+        kind, daemon, pid = fields
+        entry = usage[daemon]
+        if kind == 'status':
+            status = parse_meminfo(lines)
+            if not status:
+                continue
+            entry['pids'].append(int(pid))
+            entry['rss'] += status.get('VmRSS', 0)
+            entry['swap'] += status.get('VmSwap', 0)
+            entry['threads'] += status.get('Threads', 0)
+        elif int(pid) not in entry['pids']:
+            # The process exited before its status could be read
+            continue
+        elif kind == 'stat':
+            stat = parse_pid_stat(' '.join(lines))
+            if len(stat) < 13:
+                continue
+            entry['utime'] += int(stat[11])
+            entry['stime'] += int(stat[12])
+        elif kind == 'smaps':
+            smaps = parse_meminfo(lines)
+            if 'Pss' in smaps:
+                entry['pss'] = (entry['pss'] or 0) + smaps['Pss']
+    return usage
+
+
+def get_cpu_usage(enode, window=None):
     """
     This function reads /proc/stat file for enode and parses it to get
         cpu usage and calculate relative usage rate relative to a small time.
 
+    When a ``window`` is given, both samples are taken on the node by a single
+        command, ``window`` seconds apart, so the measured interval is not
+        distorted by the enode round trip.
+
     :param topology.platforms.base.BaseNode enode: Engine node to communicate
         with.
+    :param float window: seconds between the two node-side samples.
+
+    :rtype: float or OrderedDict
+    :return: The aggregate busy rate. With a ``window``, a dictionary
+        mapping ``cpu`` (aggregate) and ``cpuN`` (per core) to the percentage
+        of time spent in user, nice, system, idle, iowait, irq, softirq,
+        steal and ``busy``.
     """
 
+    if window is not None:
+        assert window > 0, "window must be positive"
+        cmd = (
+            "echo @@before; grep '^cpu' /proc/stat; sleep {window}; "
+            "echo @@after; grep '^cpu' /proc/stat"
+        ).format(window=window)
+        sections = split_sections(_send(enode, cmd, shell="bash"))
+        assert 'after' in sections, "could not sample /proc/stat"
+        return cpu_utilisation(
+            parse_stat(sections['before']), parse_stat(sections['after'])
+        )
+
     last_worktime = 0
     last_idletime = 0
-    output = enode("cat /proc/stat", shell="bash")
+    output = _send(enode, "cat /proc/stat", shell="bash")
     assert 'cpu' in output
     buffer1 = output.split('\n')
     line = buffer1[0]
@@ -129,7 +474,7 @@ def get_cpu_usage(enode):
     last_worktime = int(spl[2]) + int(spl[3]) + int(spl[4])
     last_idletime = int(spl[5])
     time.sleep(0.005)
-    output = enode("cat /proc/stat", shell="bash")
+    output = _send(enode, "cat /proc/stat", shell="bash")
     assert 'cpu' in output
     buffer1 = output.split('\n')
     line = buffer1[0]
@@ -142,25 +487,158 @@ def get_cpu_usage(enode):
     return rate
 
 
+def start_resource_sampler(enode, interval=1.0, size=600):
+    """
+    This function starts polling /proc/stat and /proc/meminfo from a
+        background thread, so resource usage is recorded while the test
+        steps run.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param float interval: seconds between two samples.
+    :param int size: number of samples kept in the ring buffer.
+
+    :rtype: topology_lib_systemctl.sampler.ResourceSampler
+    :return: The running sampler. Stop it with its ``stop()`` method.
+    """
+
+    return ResourceSampler(enode, interval=interval, size=size).start()
+
+
+def start_cpu_load(enode, cores=None, percent=100, period=0.1):
+    """
+    This function starts a CPU load on the given cores at a target
+        utilisation, with a single enode call and without any helper script
+        on the node.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list cores: core numbers to load, all online cores if not given.
+    :param int percent: target utilisation of each core, from 1 to 100.
+    :param float period: seconds of one busy plus idle cycle.
+
+    :rtype: topology_lib_systemctl.load.CpuLoad
+    :return: The load handle. Its ``stop()`` method, or
+        :func:`stop_cpu_load`, stops the load and reports the achieved
+        utilisation of each core.
+    """
+
+    assert 0 < percent <= 100, "percent must be between 1 and 100"
+    assert period > 0, "period must be positive"
+    cmd = start_command(cores, percent, period)
+    output = _send(enode, cmd, shell="bash")
+    load = CpuLoad.parse(enode, output, percent)
+    assert load.pids, "could not start the load"
+    return load
+
+
+def stop_cpu_load(enode, load):
+    """
+    This function stops a load started by :func:`start_cpu_load` with a
+        single enode call.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param topology_lib_systemctl.load.CpuLoad load: the load handle.
+
+    :rtype: OrderedDict
+    :return: The busy percentage of each loaded core over the run
+    """
+
+    load.enode = enode
+    return load.stop()
+
+
+def start_sampling_agent(enode, interval=1.0, path=None, compress=False):
+    """
+    This function starts a sampling loop on the node itself that records
+        /proc/stat and /proc/meminfo to a local file, for soak tests where
+        polling through enode would cost a round trip per sample.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param float interval: seconds between two samples.
+    :param str path: file the samples are written to on the node.
+    :param bool compress: gzip the samples when they are pulled.
+
+    :rtype: topology_lib_systemctl.agent.SamplingAgent
+    :return: The running agent. Its ``pull()`` and ``pull_all()`` methods
+        fetch the samples in bulk and ``stop()`` stops it.
+    """
+
+    return SamplingAgent(enode, interval, path, compress).start()
+
+
+def read_pressure(enode, units=None):
+    """
+    This function reads the pressure stall information of /proc/pressure
+        and, on cgroup v2 nodes, the cpu, memory and io pressure of the
+        given units, in one enode call.
+
+    Stall rates over a test step are computed by reading before and after
+        the step and calling ``rates()`` on the first reading.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list units: units whose pressure is also read.
+
+    :rtype: topology_lib_systemctl.pressure.PressureReading
+    """
+
+    output = _send(enode, pressure_read_command(units or ()), shell="bash")
+    return PressureReading.parse(output)
+
+
+def get_pressure(enode, window=1.0, units=None, thresholds=None):
+    """
+    This function reads the pressure stall information twice, ``window``
+        seconds apart, in a single node-side command and computes the stall
+        rates over that window.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param float window: seconds between the two readings.
+    :param list units: units whose pressure is also measured.
+    :param dict thresholds: highest acceptable stall percentages, keyed by
+        resource (``cpu``, ``memory``, ``io``) for the ``some`` rate or by
+        ``<resource>.full`` for the ``full`` rate.
+
+    :rtype: OrderedDict
+    :return: The ``some`` and ``full`` stall percentages of every resource,
+        for the node (``system``) and every unit
+    """
+
+    assert window > 0, "window must be positive"
+    reading = pressure_read_command(units or ())
+    cmd = "echo '##before'; {reading}; sleep {window}; " \
+        "echo '##after'; {reading}".format(reading=reading, window=window)
+    sections = split_sections(_send(enode, cmd, shell="bash"), prefix='##')
+    assert 'after' in sections, "could not read the pressure files"
+
+    before = PressureReading.parse('\n'.join(sections['before']))
+    after = PressureReading.parse('\n'.join(sections['after']))
+    rates = before.rates(after)
+    if thresholds:
+        violations = exceeded(rates, thresholds)
+        assert not violations, "pressure above thresholds: {}".format(
+            violations
+        )
+    return rates
+
+
 def cpu_load(enode):
     """
-    This function reads /proc/cpuinfo to get the CPU cores count and execute
-        a python script to create a load on all of the CPU cores.
+    This function creates a full load on all of the CPU cores.
 
     :param topology.platforms.base.BaseNode enode: Engine node to communicate
         with.
+
+    :rtype: list
+    :return: The list of process-ids of the load processes
     """
 
-    processid_list = []
-    output = enode("cat /proc/cpuinfo | grep processor | wc -l", shell="bash")
-    cores_count = int(output)
-    print(cores_count)
-    for cpu_core in range(0, cores_count):
-        command = "taskset --cpu-list " + str(cpu_core) + " python pyload.py&"
-        output = enode(command, shell="bash")
-        assert output.find("failed") != 1, "could not start the process"
-        processid_list.append(output.split(" ")[1])
-    return processid_list
+    load = start_cpu_load(enode)
+    return [str(pid) for pid in load.pids.values()]
 
 
 def cpu_unload(enode, processid_list):
@@ -173,149 +651,624 @@ def cpu_unload(enode, processid_list):
     """
 
     assert len(processid_list) > 0, "processes list is empty"
-    for process_id in processid_list:
-        command = "kill " + process_id
-        enode(command, shell="bash")
-    command = "\n"
-    enode(command, shell="bash")
+    _send(enode, stop_command(processid_list), shell="bash")
 
 
-def list_all_units(enode):
+def list_all_units(enode, units=None):
     '''
     List all system units
 
     :param topology.platforms.base.BaseNode enode: Engine node to communicate
         with.
+    :param list units: unit records previously returned by
+        :func:`list_units`. If not given, they are fetched from the node.
 
     :rtype: list
     :return: The list of all system units or None
     '''
 
-    cmd = ("systemctl list-units  -all | tail -n+2 | head -n -7 | "
-           "awk '{print $1, $2;}'")
-    retval = enode(cmd, shell='bash')
-    retval = retval.split('\n')
-
-    ret_list = []
-    for line in retval:
-        lines = line.split(" ")
-        if "systemctl list-units" not in line:
-            if (any(c.isalpha() for c in lines[0]) and
-                    any(c.isalpha() for c in lines[1])):
-                ret_list.append(lines[0])
-            else:
-                ret_list.append(lines[1])
-    if len(ret_list) is 0:
-        return None
-    else:
-        return ret_list
+    if units is None:
+        units = list_units(enode)
+    return [unit.name for unit in units] or None
 
 
-def reload_service_units(enode, services_list):
+def analyze_boot(enode, unit=None):
+    '''
+    Collect the startup report of the current boot
+
+    ``systemd-analyze time``, ``blame`` and ``critical-chain`` are run by a
+    single node-side command. Two reports can be compared with
+    :func:`topology_lib_systemctl.analyze.diff_boots`.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param str unit: unit whose critical chain is reported, the default
+        target if not given.
+
+    :rtype: topology_lib_systemctl.analyze.BootAnalysis
+    :return: The boot stages, the activation time of every unit and the
+        critical path
+    '''
+
+    cmd = (
+        "echo @@time; systemd-analyze time; "
+        "echo @@blame; systemd-analyze blame --no-pager; "
+        "echo @@chain; systemd-analyze critical-chain --no-pager {unit}"
+    ).format(unit=unit or '')
+    sections = split_sections(_send(enode, cmd, shell='bash'))
+    return BootAnalysis(
+        parse_time('\n'.join(sections.get('time', []))),
+        parse_blame('\n'.join(sections.get('blame', []))),
+        parse_critical_chain('\n'.join(sections.get('chain', [])))
+    )
+
+
+def reload_service_units(enode, services_list, batch=False, no_block=False,
+                         timeout=90):
     '''
     Reloads system service units
 
+    By default every service is restarted with its own ``systemctl restart``
+    call and the function stops at the first failure. With ``batch`` set, the
+    whole list is restarted by a single node-side command and a per-unit
+    result map is returned instead.
+
     :param topology.platforms.base.BaseNode enode: Engine node to communicate
         with.
     :param list services_list: contains list of services to reload
+    :param bool batch: restart all the services in one enode call.
+    :param bool no_block: in batch mode, queue all the restart jobs with
+        ``--no-block`` and then wait once for the job queue to drain.
+    :param int timeout: in no-block batch mode, maximum number of seconds to
+        wait for the queued jobs.
+
+    :rtype: boolean or OrderedDict
+    :return: "True" if succesful. In batch mode, a dictionary mapping each
+        service to a dictionary with the keys ``ok``, ``exit_code``,
+        ``elapsed`` (seconds) and, in no-block mode, ``state``.
+    '''
 
-    :rtype: boolean
-    :return: "True" if succesful
+    assert len(services_list) > 0, "services list is empty"
+    invalidate_unit_cache(enode)
+    if not batch:
+        assert not no_block, "no_block requires batch mode"
+        for service in services_list:
+            cmd_restart = ("systemctl restart " + service)
+            retval_restart = _send(enode, cmd_restart, shell='bash')
+            assert "Failed" not in retval_restart, "Services unable to restart"
+        return True
+
+    services = " ".join(services_list)
+    results = OrderedDict(
+        (service, {'ok': False, 'exit_code': None, 'elapsed': None})
+        for service in services_list
+    )
+
+    if not no_block:
+        cmd = (
+            "for unit in {services}; do "
+            "start=$(date +%s%N); "
+            "systemctl restart $unit >/dev/null 2>&1; "
+            "rc=$?; "
+            "echo \"@@restart $unit $rc $start $(date +%s%N)\"; "
+            "done"
+        ).format(services=services)
+        output = _send(enode, cmd, shell='bash')
+        for unit, exit_code, start, end in _marker_fields(output, 'restart'):
+            results[unit].update(
+                ok=(exit_code == '0'),
+                exit_code=int(exit_code),
+                elapsed=(int(end) - int(start)) / 1e9
+            )
+        return results
+
+    cmd = (
+        "start=$(date +%s%N); "
+        "for unit in {services}; do "
+        "systemctl restart --no-block $unit >/dev/null 2>&1; "
+        "echo \"@@queued $unit $?\"; "
+        "done; "
+        "deadline=$(($(date +%s) + {timeout})); "
+        "while [ -n \"$(systemctl list-jobs --no-legend {services})\" ] && "
+        "[ $(date +%s) -lt $deadline ]; do sleep 0.1; done; "
+        "echo \"@@waited $start $(date +%s%N)\"; "
+        "for unit in {services}; do "
+        "echo \"@@state $unit $(systemctl is-active $unit)\"; "
+        "done"
+    ).format(services=services, timeout=int(timeout))
+    output = _send(enode, cmd, shell='bash')
+
+    elapsed = None
+    for start, end in _marker_fields(output, 'waited'):
+        elapsed = (int(end) - int(start)) / 1e9
+    for unit, exit_code in _marker_fields(output, 'queued'):
+        results[unit].update(exit_code=int(exit_code), elapsed=elapsed)
+    for unit, state in _marker_fields(output, 'state'):
+        results[unit]['state'] = state
+        results[unit]['ok'] = (
+            results[unit]['exit_code'] == 0 and state == 'active'
+        )
+    return results
+
+
+def get_unit_properties(enode, units, properties=DEFAULT_PROPERTIES):
+    '''
+    Fetch a set of properties of system units in one enode call
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list units: contains list of units to query
+    :param tuple properties: names of the properties to fetch; by default
+        MainPID, NRestarts, MemoryCurrent, CPUUsageNSec,
+        ActiveEnterTimestampMonotonic and Result.
+
+    :rtype: OrderedDict
+    :return: A dictionary mapping each unit to its
+        :class:`topology_lib_systemctl.properties.UnitProperties`
+    '''
+
+    assert len(units) > 0, "units list is empty"
+    assert len(properties) > 0, "properties list is empty"
+    cmd = "systemctl show {properties} {units}".format(
+        properties=" ".join("-p " + prop for prop in properties),
+        units=" ".join(units)
+    )
+    blocks = parse_show(_send(enode, cmd, shell='bash'))
+    return OrderedDict(
+        (unit, UnitProperties(unit, block))
+        for unit, block in zip(units, blocks)
+    )
+
+
+def wait_for_units(enode, units, state='active', timeout=30,
+                   interval=0.1, max_interval=2.0, fail_fast=False):
+    '''
+    Wait for system units to reach an active state
+
+    All the units are checked with one ``systemctl show`` call per poll. The
+    delay between polls starts at ``interval`` and doubles up to
+    ``max_interval``, so fast units are noticed quickly without flooding
+    the node while slow units come up.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list units: contains list of units to wait for
+    :param state: ActiveState to wait for, or tuple of accepted states.
+    :param float timeout: maximum number of seconds to wait.
+    :param float interval: delay before the second poll.
+    :param float max_interval: maximum delay between two polls.
+    :param bool fail_fast: stop waiting as soon as a unit is ``failed``,
+        unless ``failed`` is an accepted state.
+
+    :rtype: dict
+    :return: A dictionary with ``converged`` (True if every unit reached the
+        state), ``elapsed`` seconds, number of ``polls``, the last
+        ``states`` as a mapping of unit to (ActiveState, SubState) and the
+        ``stuck`` mapping of the units that did not converge
+    '''
+
+    assert len(units) > 0, "units list is empty"
+    assert timeout >= 0, "timeout must not be negative"
+    accepted = (state,) if not isinstance(state, (tuple, list)) else state
+
+    cmd = "systemctl show -p Id -p ActiveState -p SubState " + " ".join(units)
+    start = _clock()
+    deadline = start + timeout
+    polls = 0
+    delay = interval
+    while True:
+        blocks = parse_show(_send(enode, cmd, shell='bash'))
+        polls += 1
+        states = OrderedDict(
+            (unit, (block.get('ActiveState'), block.get('SubState')))
+            for unit, block in zip(units, blocks)
+        )
+        stuck = OrderedDict(
+            (unit, states.get(unit, (None, None))) for unit in units
+            if states.get(unit, (None, None))[0] not in accepted
+        )
+
+        now = _clock()
+        failed = fail_fast and 'failed' not in accepted and any(
+            active == 'failed' for active, _ in stuck.values()
+        )
+        if not stuck or failed or now >= deadline:
+            break
+        time.sleep(min(delay, deadline - now))
+        delay = min(delay * 2, max_interval)
+
+    return {
+        'converged': not stuck,
+        'elapsed': _clock() - start,
+        'polls': polls,
+        'states': states,
+        'stuck': stuck
+    }
+
+
+def parallel_restart_units(enode, services_list, stop_on_failure=True):
+    '''
+    Restart system units in parallel waves that follow their dependencies
+
+    The After, Requires, BindsTo and PartOf relations of all the units are
+    fetched with one ``systemctl show`` call and used to group the units
+    into waves (see :mod:`topology_lib_systemctl.restart`). All the waves are
+    then restarted by a second, single node-side command, one
+    ``systemctl restart`` per wave. Units that systemd restarts along with
+    another requested unit are not restarted twice.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list services_list: contains list of services to restart
+    :param bool stop_on_failure: skip the remaining waves once a wave fails.
+
+    :rtype: dict
+    :return: A dictionary with the ``waves`` (each a dictionary with its
+        ``units``, the ``restarted`` ones, ``exit_code`` and ``duration``
+        in seconds, or None if skipped), the ``cascaded`` units, the units
+        in dependency ``cycles``, the ``startup`` seconds of every unit, the
+        ``total`` seconds, the ``serial`` estimate (sum of the startup
+        times) and the time ``saved``
     '''
 
     assert len(services_list) > 0, "services list is empty"
-    for service in services_list:
-        cmd_restart = ("systemctl restart " + service)
-        retval_restart = enode(cmd_restart, shell='bash')
-        assert "Failed" not in retval_restart, "Services unable to restart"
+    invalidate_unit_cache(enode)
+
+    cmd = "systemctl show {properties} {units}".format(
+        properties=" ".join("-p " + prop for prop in DEPENDENCY_PROPERTIES),
+        units=" ".join(services_list)
+    )
+    plan = plan_restart(
+        services_list, parse_show(_send(enode, cmd, shell='bash'))
+    )
+
+    steps = ["failed=; begin=$(date +%s%N)"]
+    for index, wave in enumerate(plan.waves):
+        explicit = plan.explicit(wave)
+        if not explicit:
+            steps.append("echo \"@@wave {} 0 0 0\"".format(index))
+            continue
+        steps.append((
+            "if [ -z \"$failed\" ]; then "
+            "start=$(date +%s%N); systemctl restart {units}; rc=$?; "
+            "echo \"@@wave {index} $rc $start $(date +%s%N)\"; "
+            "{check}"
+            "fi"
+        ).format(
+            units=" ".join(explicit), index=index,
+            check="[ $rc -eq 0 ] || failed=1; " if stop_on_failure else ""
+        ))
+    steps.append("echo \"@@total $begin $(date +%s%N)\"")
+    steps.append(
+        "echo @@show; systemctl show -p Id -p InactiveExitTimestampMonotonic "
+        "-p ActiveEnterTimestampMonotonic " + " ".join(services_list)
+    )
+    output = _send(enode, "; ".join(steps), shell='bash')
+
+    waves = [
+        {
+            'units': wave, 'restarted': plan.explicit(wave),
+            'exit_code': None, 'duration': None
+        }
+        for wave in plan.waves
+    ]
+    for index, exit_code, start, end in _marker_fields(output, 'wave'):
+        waves[int(index)].update(
+            exit_code=int(exit_code), duration=(int(end) - int(start)) / 1e9
+        )
+    total = 0.0
+    for start, end in _marker_fields(output, 'total'):
+        total = (int(end) - int(start)) / 1e9
+
+    startup = OrderedDict()
+    blocks = parse_show('\n'.join(split_sections(output).get('show', [])))
+    for unit, block in zip(services_list, blocks):
+        exited = int(block.get('InactiveExitTimestampMonotonic') or 0)
+        entered = int(block.get('ActiveEnterTimestampMonotonic') or 0)
+        startup[unit] = max(0, entered - exited) / 1e6
+    serial = sum(startup.values())
+
+    return {
+        'waves': waves,
+        'cascaded': plan.cascaded,
+        'cycles': plan.cycles,
+        'startup': startup,
+        'total': total,
+        'serial': serial,
+        'saved': serial - total
+    }
+
+
+def _consume_journal(enode, units, records):
+    for record in records:
+        journal.set_cursor(enode, units, record.cursor)
+        yield record
+
+
+def read_journal(enode, units, limit=1000, initial=10):
+    '''
+    Read the journal entries of system units logged since the last call
+
+    A cursor is kept per node and per set of units, and only the entries
+    after it are fetched with ``journalctl --after-cursor``. The first call
+    for a set of units returns its ``initial`` latest entries; if there are
+    none, the cursor starts at the end of the whole journal so that later
+    entries are not missed. The entries are fetched when the function is
+    called but parsed lazily, and the cursor advances as they are consumed,
+    so a consumer stopping early gets the remaining entries on the next
+    call.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list units: contains list of units to read the journal of
+    :param int limit: maximum number of entries fetched by one call.
+    :param int initial: number of entries returned by the first call.
+
+    :rtype: generator
+    :return: A generator of journal records, oldest first
+        (:class:`topology_lib_systemctl.journal.JournalRecord`)
+    '''
+
+    assert len(units) > 0, "units list is empty"
+    assert limit > 0, "limit must be positive"
+    cursor = journal.get_cursor(enode, units)
+
+    cmd = "journalctl --no-pager --output=json " + " ".join(
+        "-u " + unit for unit in units
+    )
+    if cursor is not None:
+        cmd += " --after-cursor='{}' | head -n {}".format(cursor, limit)
+        output = _send(enode, cmd, shell='bash')
+        return _consume_journal(enode, units, journal.parse_records(output))
+
+    # The end of the whole journal is read first, so it predates any entry
+    # of the units that the second read could miss
+    cmd = (
+        "echo @@tail; journalctl --no-pager --output=json -n 1; "
+        "echo @@entries; {} -n {}"
+    ).format(cmd, min(initial, limit))
+    sections = split_sections(_send(enode, cmd, shell='bash'))
+    entries = sections.get('entries', [])
+    if not any(line.strip().startswith('{') for line in entries):
+        tail = '\n'.join(sections.get('tail', []))
+        for record in journal.parse_records(tail):
+            journal.set_cursor(enode, units, record.cursor)
+    return _consume_journal(
+        enode, units, journal.parse_records('\n'.join(entries))
+    )
+
+
+def reset_journal_cursors(enode):
+    '''
+    Forget the journal cursors of the node, so the next
+    :func:`read_journal` starts over from the latest entries
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    '''
+
+    journal.reset_cursors(enode)
+
+
+def get_units_cgroup_usage(enode, units):
+    '''
+    Read the cgroup resource usage of system units in one enode call
+
+    ``memory.current``, ``memory.stat``, ``cpu.stat`` and ``io.stat`` are
+    read on cgroup v2 nodes; ``memory.usage_in_bytes``, ``memory.stat``,
+    ``cpuacct.usage``, ``cpuacct.stat`` and
+    ``blkio.throttle.io_service_bytes`` on cgroup v1 nodes. Rates between
+    two readings are computed with their ``rates()`` method.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list units: contains list of units to account for
+
+    :rtype: topology_lib_systemctl.cgroup.CgroupReading
+    :return: The timestamped per unit ``memory`` (bytes), ``cpu_usec``,
+        ``cpu_user_usec``, ``cpu_system_usec``, ``io_read_bytes``,
+        ``io_write_bytes`` and ``memory_stat`` breakdown
+    '''
 
-    return True
+    assert len(units) > 0, "units list is empty"
+    output = _send(enode, cgroup_read_command(units), shell='bash')
+    return CgroupReading.parse(output)
 
 
-def list_loaded_units(enode):
+def list_loaded_units(enode, units=None):
     '''
     List loaded system units
 
     :param topology.platforms.base.BaseNode enode: Engine node to communicate
         with.
+    :param list units: unit records previously returned by
+        :func:`list_units`. If not given, they are fetched from the node.
 
     :rtype: list
     :return: The list of all loaded units or None
     '''
 
-    cmd = ("systemctl list-units  --state=loaded | tail -n+2 | head -n -7 | "
-           "awk '{print $1, $2;}'")
-    retval = enode(cmd, shell='bash')
-    retval = retval.split('\n')
-
-    ret_list = []
-    for line in retval:
-        lines = line.split(" ")
-        if "systemctl list-units" not in line:
-            if (any(c.isalpha() for c in lines[0]) and
-                    any(c.isalpha() for c in lines[1])):
-                ret_list.append(lines[0])
-            else:
-                ret_list.append(lines[1])
-    if len(ret_list) is 0:
-        return None
-    else:
-        return ret_list
+    if units is None:
+        units = list_units(enode)
+    return [unit.name for unit in units if unit.load == 'loaded'] or None
+
 
+#: Process states expected after a signal has been handled, see
+#: :func:`signal_daemons`. ``None`` means the process is gone.
+_SIGNAL_STATES = {
+    'KILL': (None, 'Z'),
+    'TERM': (None, 'Z'),
+    'STOP': ('T', 't'),
+    'CONT': ('R', 'S', 'D', 'I'),
+}
 
-def kill_daemons(enode, daemons_list):
+_SIGNAL_NUMBERS = {'9': 'KILL', '15': 'TERM', '19': 'STOP', '18': 'CONT'}
+
+#: Node-side lookup of every PID in the cgroup tree of a unit, with cgroup
+#: v2 (unified) and v1 (systemd named hierarchy) layouts.
+_CGROUP_PIDS = (
+    "cg=$(systemctl show -p ControlGroup $daemon | cut -d= -f2); "
+    "for root in /sys/fs/cgroup /sys/fs/cgroup/systemd; do "
+    "[ -n \"$cg\" ] && [ -d $root$cg ] && "
+    "pids=$(find $root$cg -name cgroup.procs -exec cat {} + | sort -un) && "
+    "break; "
+    "done"
+)
+
+
+def signal_daemons(enode, daemons_list, signal, cgroup=False, verify=True,
+                   settle=0.1):
     """
-    This function kills daemons in the list passed as parameter
+    This function delivers a signal to every daemon in the list with a
+        single node-side command, and reports the outcome per daemon
+        instead of stopping at the first daemon without processes.
 
     :param topology.platforms.base.BaseNode enode: Engine node to communicate
         with.
-    :param list daemons_list: This is the list of daemons that needs to be
-        killed.
+    :param list daemons_list: This is the list of daemons to signal.
+    :param signal: signal name without the ``SIG`` prefix (``KILL``,
+        ``STOP``, ...) or number.
+    :param bool cgroup: treat the names as systemd units and signal every
+        process of the unit cgroup, child processes included, instead of the
+        processes matching the name.
+    :param bool verify: read the state of every signalled process back.
+    :param float settle: seconds to let the signals be handled before
+        verifying.
+
+    :rtype: OrderedDict
+    :return: A dictionary mapping each daemon to a dictionary with the
+        ``pids`` matched, whether the signal was ``delivered``, the
+        ``states`` of the processes afterwards (None for processes that are
+        gone) and whether they ``verified`` the expected state (None when
+        nothing is expected for the signal or ``verify`` is off)
     """
 
     assert len(daemons_list) > 0, "empty daemons list"
     for daemon in daemons_list:
         assert daemon, "null daemon name"
-        daemon_kill_command = "killall -9 "+daemon
-        output = enode(daemon_kill_command, shell="bash")
-        assert "no process killed" not in output, "Invalid daemon"
+    invalidate_unit_cache(enode)
+
+    signal = str(signal).upper()
+    if signal.startswith('SIG'):
+        signal = signal[3:]
+    signal = _SIGNAL_NUMBERS.get(signal, signal)
+
+    lookup = _CGROUP_PIDS if cgroup else "pids=$(pidof $daemon)"
+    cmd = (
+        "targets=; "
+        "for daemon in {daemons}; do "
+        "pids=; {lookup}; "
+        "echo \"@@pids $daemon $pids\"; "
+        "if [ -n \"$pids\" ]; then "
+        "kill -{signal} $pids 2>/dev/null; echo \"@@sent $daemon $?\"; "
+        "fi; "
+        "for pid in $pids; do targets=\"$targets $daemon/$pid\"; done; "
+        "done"
+    ).format(
+        daemons=" ".join(daemons_list), lookup=lookup, signal=signal
+    )
+    if verify:
+        cmd += (
+            "; sleep {settle}; "
+            "for target in $targets; do "
+            "pid=${{target#*/}}; "
+            "echo \"@@state ${{target%/*}} $pid "
+            "$(sed 's/.*) //' /proc/$pid/stat 2>/dev/null | cut -d' ' -f1)\"; "
+            "done"
+        ).format(settle=settle)
+    output = _send(enode, cmd, shell="bash")
+
+    report = OrderedDict(
+        (daemon, {
+            'pids': [], 'delivered': False, 'states': OrderedDict(),
+            'verified': None
+        })
+        for daemon in daemons_list
+    )
+    for fields in _marker_fields(output, 'pids'):
+        report[fields[0]]['pids'] = [int(pid) for pid in fields[1:]]
+    for daemon, exit_code in _marker_fields(output, 'sent'):
+        report[daemon]['delivered'] = exit_code == '0'
+    for fields in _marker_fields(output, 'state'):
+        state = fields[2] if len(fields) > 2 else None
+        report[fields[0]]['states'][int(fields[1])] = state
+
+    expected = _SIGNAL_STATES.get(signal)
+    if verify and expected is not None:
+        for entry in report.values():
+            entry['verified'] = bool(entry['pids']) and all(
+                state in expected for state in entry['states'].values()
+            )
+    return report
+
+
+def _assert_signalled(report):
+    for entry in report.values():
+        assert entry['pids'] and entry['delivered'], "Invalid daemon"
+
+
+def kill_daemons(enode, daemons_list, cgroup=False):
+    """
+    This function kills daemons in the list passed as parameter
 
+    Every daemon is signalled before an invalid daemon is reported.
 
-def halt_daemons(enode, daemons_list):
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param list daemons_list: This is the list of daemons that needs to be
+        killed.
+    :param bool cgroup: kill every process of the daemon unit cgroup.
+
+    :rtype: OrderedDict
+    :return: The per daemon report of :func:`signal_daemons`
+    """
+
+    report = signal_daemons(enode, daemons_list, 'KILL', cgroup=cgroup)
+    _assert_signalled(report)
+    return report
+
+
+def halt_daemons(enode, daemons_list, cgroup=False):
     """
     This function halts daemons in the list passed as parameter
 
+    Every daemon is signalled before an invalid daemon is reported.
+
     :param topology.platforms.base.BaseNode enode: Engine node to communicate
         with.
     :param list daemons_list: This is the list of daemons that needs to be
         halted.
+    :param bool cgroup: halt every process of the daemon unit cgroup.
+
+    :rtype: OrderedDict
+    :return: The per daemon report of :func:`signal_daemons`
     """
 
-    assert len(daemons_list) > 0, "empty daemons list"
-    for daemon in daemons_list:
-        assert daemon, "null daemon name"
-        daemon_kill_command = "killall -STOP "+daemon
-        output = enode(daemon_kill_command, shell="bash")
-        assert "no process killed" not in output, "Invalid daemon"
+    report = signal_daemons(enode, daemons_list, 'STOP', cgroup=cgroup)
+    _assert_signalled(report)
+    return report
 
 
-def continue_halted_daemons(enode, daemons_list):
+def continue_halted_daemons(enode, daemons_list, cgroup=False):
     """
     This function resumes the halted daemons in the list passed
         as parameter
 
+    Every daemon is signalled before an invalid daemon is reported.
+
     :param topology.platforms.base.BaseNode enode: Engine node to communicate
         with.
     :param list daemons_list: This is the list of halted daemons that needs
         to be continued.
+    :param bool cgroup: resume every process of the daemon unit cgroup.
+
+    :rtype: OrderedDict
+    :return: The per daemon report of :func:`signal_daemons`
     """
 
-    assert len(daemons_list) > 0, "empty daemons list"
-    for daemon in daemons_list:
-        assert daemon, "null daemon name"
-        daemon_kill_command = "killall -CONT "+daemon
-        output = enode(daemon_kill_command, shell="bash")
-        assert "no process killed" not in output, "Invalid daemon"
+    report = signal_daemons(enode, daemons_list, 'CONT', cgroup=cgroup)
+    _assert_signalled(report)
+    return report
 
 
 def enable_node_as_ssh_client(enode):
@@ -326,22 +1279,46 @@ def enable_node_as_ssh_client(enode):
     """
     cmd = "sed -i 's/PermitRootLogin yes/# PermitRootLogin yes/'\
             /etc/ssh/ssh_config"
-    enode(cmd, shell="bash")
+    _send(enode, cmd, shell="bash")
     cmd = "echo 'UserKnownHostsFile / dev / null'\
             >> /etc/ssh/ssh_config"
-    enode(cmd, shell="bash")
+    _send(enode, cmd, shell="bash")
 
 
 __all__ = [
+    'list_units',
+    'take_unit_snapshot',
+    'enable_unit_cache',
+    'disable_unit_cache',
+    'invalidate_unit_cache',
+    'unit_cache_stats',
     'check_failed_services',
+    'triage_failed_units',
     'get_memory_usage',
     'memory_leak_check',
+    'collect_memory_samples',
+    'memory_leak_trend',
+    'get_daemons_usage',
     'get_cpu_usage',
+    'start_resource_sampler',
+    'start_sampling_agent',
+    'read_pressure',
+    'get_pressure',
+    'start_cpu_load',
+    'stop_cpu_load',
     'cpu_load',
     'cpu_unload',
     'list_all_units',
+    'analyze_boot',
     'reload_service_units',
+    'parallel_restart_units',
+    'get_unit_properties',
+    'wait_for_units',
+    'read_journal',
+    'reset_journal_cursors',
+    'get_units_cgroup_usage',
     'list_loaded_units',
+    'signal_daemons',
     'kill_daemons',
     'halt_daemons',
     'continue_halted_daemons',
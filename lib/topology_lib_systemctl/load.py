@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Duty-cycle controlled CPU load generation on the node.
+
+Each loaded core runs ``yes`` pinned with ``taskset`` under a small shell
+controller that alternately resumes and stops it, so no helper script needs
+to be copied to the node. Each controller leads its own session, so killing
+the process group removes the controller and its worker together.
+
+The controller reports its own PID: under job control, ``setsid`` forks
+because the background job already leads a process group, so ``$!`` is not
+the session leader.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from collections import OrderedDict
+
+from .instrument import send
+from .proc import split_sections, parse_stat, cpu_utilisation
+
+
+def _worker_script(percent, period):
+    if percent >= 100:
+        return 'exec yes'
+    busy = period * percent / 100.0
+    return (
+        'yes & '
+        'while :; do kill -CONT $!; sleep {busy:.3f}; '
+        'kill -STOP $!; sleep {idle:.3f}; done'
+    ).format(busy=busy, idle=period - busy)
+
+
+def start_command(cores, percent, period):
+    """
+    Build the node-side command starting the load on the given cores.
+
+    :param list cores: core numbers, or None for every online core.
+    :param int percent: target utilisation of each core.
+    :param float period: seconds of one busy plus idle cycle.
+    :rtype: str
+    """
+
+    if cores is None:
+        core_list = '$(seq 0 $(($(nproc) - 1)))'
+    else:
+        core_list = ' '.join(str(int(core)) for core in cores)
+    # The pipe to cat returns once every controller has printed its PID and
+    # detached from the output
+    return (
+        "{{ for core in {cores}; do "
+        "taskset -c $core setsid sh -c "
+        "'echo \"@@pid $1 $$\"; exec </dev/null >/dev/null 2>&1; {script}' "
+        "sh $core & "
+        "done; }} | cat; "
+        "echo @@stat; grep '^cpu' /proc/stat"
+    ).format(cores=core_list, script=_worker_script(percent, period))
+
+
+def stop_command(pids):
+    """
+    Build the node-side command stopping the given load process groups.
+
+    :param list pids: process group leaders returned when starting the load.
+    :rtype: str
+    """
+
+    return (
+        "echo @@stat; grep '^cpu' /proc/stat; "
+        "for pid in {pids}; do kill -KILL -- -$pid 2>/dev/null; done"
+    ).format(pids=' '.join(str(pid) for pid in pids))
+
+
+class CpuLoad(object):
+    """
+    Handle of a running CPU load.
+
+    :param topology.platforms.base.BaseNode enode: Engine node the load runs
+        on.
+    :param OrderedDict pids: mapping of core number to process group leader.
+    :param int percent: target utilisation of each core.
+    :param OrderedDict stat: ``/proc/stat`` counters when the load started.
+    """
+
+    def __init__(self, enode, pids, percent, stat):
+        self.enode = enode
+        self.pids = pids
+        self.percent = percent
+        self.stat = stat
+        self.achieved = None
+
+    @property
+    def cores(self):
+        """
+        Loaded core numbers.
+        """
+
+        return list(self.pids)
+
+    @classmethod
+    def parse(cls, enode, output, percent):
+        """
+        Build a handle from the output of :func:`start_command`.
+        """
+
+        sections = split_sections(output)
+        pids = OrderedDict()
+        for name in sections:
+            fields = name.split()
+            if len(fields) == 3 and fields[0] == 'pid':
+                pids[int(fields[1])] = int(fields[2])
+        return cls(enode, pids, percent, parse_stat(sections.get('stat', [])))
+
+    def achieved_load(self, stat):
+        """
+        Busy percentage of each loaded core since the load started.
+
+        :param OrderedDict stat: later ``/proc/stat`` counters.
+        :rtype: OrderedDict
+        """
+
+        usage = cpu_utilisation(self.stat, stat)
+        return OrderedDict(
+            (core, usage['cpu{}'.format(core)]['busy'])
+            for core in self.pids if 'cpu{}'.format(core) in usage
+        )
+
+    def stop(self):
+        """
+        Stop the load with one enode call.
+
+        :rtype: OrderedDict
+        :return: The busy percentage of each loaded core over the run.
+        """
+
+        output = send(
+            self.enode, stop_command(self.pids.values()), shell='bash'
+        )
+        stat = parse_stat(split_sections(output).get('stat', []))
+        self.achieved = self.achieved_load(stat)
+        return self.achieved
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.achieved is None:
+            self.stop()
+
+
+__all__ = [
+    'start_command',
+    'stop_command',
+    'CpuLoad'
+]
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Engine node running the library commands on the local host.
+
+:class:`LocalEnode` keeps one ``bash`` process alive and feeds it every
+command, so the parsing and sampling code can be exercised, profiled and
+load tested without a topology platform and without a fork and exec per
+call::
+
+    with LocalEnode() as enode:
+        print(library.get_cpu_usage(enode, window=1))
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import os
+import re
+import uuid
+import select
+from threading import Lock
+from subprocess import Popen, PIPE, STDOUT
+
+
+_PROC = re.compile(r'(?<![\w/])/proc(?=/|\b)')
+
+
+class LocalEnode(object):
+    """
+    Engine node backed by a persistent local shell.
+
+    :param str proc_root: directory standing in for ``/proc``. Every
+        ``/proc`` path in the commands is rewritten to it, so canned
+        ``stat``, ``meminfo`` or ``<pid>/status`` files can be served.
+        Tools that read ``/proc`` by themselves, like ``pidof``, still see
+        the real one.
+    :param float timeout: seconds to wait for a command to complete.
+    :param str executable: shell to run.
+    """
+
+    def __init__(self, proc_root=None, timeout=60, executable='/bin/bash'):
+        self.proc_root = proc_root.rstrip('/') if proc_root else None
+        self.timeout = timeout
+        self.executable = executable
+        self.exit_status = None
+        self._process = None
+        self._lock = Lock()
+
+    def _shell(self):
+        if self._process is None or self._process.poll() is not None:
+            self._process = Popen(
+                [self.executable, '--noprofile', '--norc'],
+                stdin=PIPE, stdout=PIPE, stderr=STDOUT
+            )
+        return self._process
+
+    def rewrite(self, command):
+        """
+        Apply the ``/proc`` substitution to a command.
+        """
+
+        if self.proc_root is None:
+            return command
+        return _PROC.sub(lambda match: self.proc_root, command)
+
+    def __call__(self, command, shell='bash'):
+        assert shell in (None, 'bash'), "only the bash shell is supported"
+        marker = '@@done-{}'.format(uuid.uuid4().hex)
+        script = (
+            "{{ {command}\n}} </dev/null 2>&1; "
+            "printf '\\n%s %d\\n' {marker} $?\n"
+        ).format(command=self.rewrite(command), marker=marker)
+
+        with self._lock:
+            process = self._shell()
+            process.stdin.write(script.encode('utf-8'))
+            process.stdin.flush()
+            output = self._read_until(process, marker.encode('utf-8'))
+
+        text, _, status = output.decode('utf-8', 'replace').rpartition(
+            '\n' + marker + ' '
+        )
+        self.exit_status = int(status.split()[0])
+        # Engine nodes strip the trailing newline of the command output
+        return text.rstrip('\n')
+
+    def _read_until(self, process, marker):
+        fd = process.stdout.fileno()
+        chunks = []
+        tail = b''
+        while True:
+            ready, _, _ = select.select([fd], [], [], self.timeout)
+            if not ready:
+                self.close()
+                raise RuntimeError('local command timed out')
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                self.close()
+                raise RuntimeError('local shell exited')
+            chunks.append(chunk)
+            tail = (tail + chunk)[-(len(marker) + 64):]
+            if marker in tail and tail.endswith(b'\n'):
+                return b''.join(chunks)
+
+    def close(self):
+        """
+        Terminate the shell. It is restarted by the next command.
+        """
+
+        process, self._process = self._process, None
+        if process is not None and process.poll() is None:
+            process.kill()
+            process.wait()
+        if process is not None:
+            process.stdin.close()
+            process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+__all__ = [
+    'LocalEnode'
+]
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Pressure stall information (PSI) of the node and of units.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from collections import OrderedDict
+
+from .proc import split_sections
+
+
+#: Resources reported by the kernel pressure interface.
+RESOURCES = ('cpu', 'memory', 'io')
+
+#: Name of the node wide source in readings and rates.
+SYSTEM = 'system'
+
+
+def read_command(units=()):
+    """
+    Build the node-side command reading the pressure files of the node and,
+    on cgroup v2, of the given units.
+
+    :param list units: unit names.
+    :rtype: str
+    """
+
+    command = (
+        "echo \"@@time $(date +%s.%N)\"; "
+        "for resource in {resources}; do "
+        "echo \"@@psi {system} $resource\"; "
+        "cat /proc/pressure/$resource 2>/dev/null; "
+        "done"
+    ).format(resources=' '.join(RESOURCES), system=SYSTEM)
+    if units:
+        command += (
+            "; for unit in {units}; do "
+            "cg=$(systemctl show -p ControlGroup $unit | cut -d= -f2); "
+            "for resource in {resources}; do "
+            "echo \"@@psi $unit $resource\"; "
+            "[ -n \"$cg\" ] && "
+            "cat /sys/fs/cgroup$cg/$resource.pressure 2>/dev/null; "
+            "done; done"
+        ).format(units=' '.join(units), resources=' '.join(RESOURCES))
+    return command
+
+
+def parse_psi(lines):
+    """
+    Parse one pressure file.
+
+    >>> psi = parse_psi(['some avg10=1.50 avg60=0.20 avg300=0.00 total=300'])
+    >>> psi['some']['avg10'], psi['some']['total']
+    (1.5, 300)
+
+    :param list lines: lines of the file.
+    :rtype: OrderedDict
+    :return: A dictionary mapping ``some`` and ``full`` to their ``avg10``,
+        ``avg60`` and ``avg300`` percentages and ``total`` stall time in
+        microseconds.
+    """
+
+    psi = OrderedDict()
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0] not in ('some', 'full'):
+            continue
+        values = OrderedDict()
+        for field in fields[1:]:
+            key, _, value = field.partition('=')
+            values[key] = int(value) if key == 'total' else float(value)
+        psi[fields[0]] = values
+    return psi
+
+
+class PressureReading(object):
+    """
+    Pressure files of the node and of units at one point in time.
+
+    :param float timestamp: node time of the reading, in seconds.
+    :param OrderedDict sources: mapping of source (:data:`SYSTEM` or unit
+        name) to a mapping of resource to :func:`parse_psi` values.
+    """
+
+    __slots__ = ('timestamp', 'sources')
+
+    def __init__(self, timestamp, sources):
+        self.timestamp = timestamp
+        self.sources = sources
+
+    @classmethod
+    def parse(cls, output):
+        """
+        Build a reading from the output of :func:`read_command`.
+        """
+
+        timestamp = None
+        sources = OrderedDict()
+        for name, lines in split_sections(output).items():
+            fields = name.split()
+            if fields[0] == 'time' and len(fields) == 2:
+                timestamp = float(fields[1])
+            elif fields[0] == 'psi' and len(fields) == 3:
+                psi = parse_psi(lines)
+                if psi:
+                    sources.setdefault(fields[1], OrderedDict())[
+                        fields[2]
+                    ] = psi
+        return cls(timestamp, sources)
+
+    def rates(self, later):
+        """
+        Compute the stall rates between this reading and a later one.
+
+        :param PressureReading later: the later reading.
+        :rtype: OrderedDict
+        :return: A dictionary mapping each source and resource to the
+            percentage of the interval during which ``some`` and ``full``
+            tasks were stalled (``full`` is None for resources without it).
+        """
+
+        interval = later.timestamp - self.timestamp
+        assert interval > 0, "readings must be taken in order"
+
+        rates = OrderedDict()
+        for source, resources in later.sources.items():
+            for resource, psi in resources.items():
+                before = self.sources.get(source, {}).get(resource)
+                if before is None:
+                    continue
+                stall = OrderedDict()
+                for kind in ('some', 'full'):
+                    if kind in psi and kind in before:
+                        stall[kind] = (
+                            (psi[kind]['total'] - before[kind]['total']) /
+                            (interval * 1e4)
+                        )
+                    else:
+                        stall[kind] = None
+                rates.setdefault(source, OrderedDict())[resource] = stall
+        return rates
+
+
+def exceeded(rates, thresholds):
+    """
+    List the stall rates above their thresholds.
+
+    >>> exceeded({'system': {'memory': {'some': 7.5, 'full': 0.5}}},
+    ...          {'memory': 5, 'memory.full': 1}) == [
+    ...     ('system', 'memory', 'some', 7.5, 5)]
+    True
+
+    :param dict rates: :meth:`PressureReading.rates` result.
+    :param dict thresholds: mapping of ``<resource>`` (for ``some``) or
+        ``<resource>.full`` to the highest acceptable stall percentage,
+        applied to every source.
+    :rtype: list
+    :return: The (source, resource, kind, rate, threshold) of every
+        violation.
+    """
+
+    violations = []
+    for source, resources in rates.items():
+        for resource, stall in resources.items():
+            for kind in ('some', 'full'):
+                key = resource if kind == 'some' else resource + '.full'
+                limit = thresholds.get(key)
+                rate = stall.get(kind)
+                if limit is not None and rate is not None and rate > limit:
+                    violations.append((source, resource, kind, rate, limit))
+    return violations
+
+
+__all__ = [
+    'RESOURCES',
+    'SYSTEM',
+    'read_command',
+    'parse_psi',
+    'PressureReading',
+    'exceeded'
+]
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Parsers and helpers for the ``/proc`` files read by the library.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from collections import OrderedDict
+
+
+#: Columns of the ``cpu`` lines in ``/proc/stat``, in kernel order.
+CPU_FIELDS = (
+    'user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal'
+)
+
+
+def split_sections(output, prefix='@@'):
+    """
+    Split the output of a node-side script into the sections announced by
+    ``<prefix><name>`` marker lines.
+
+    Text before the first marker, such as the echoed command, is dropped.
+
+    >>> sections = split_sections('cmd\\n@@a\\n1\\n@@b\\n2\\n3')
+    >>> sections == {'a': ['1'], 'b': ['2', '3']}
+    True
+
+    :param str output: raw command output.
+    :param str prefix: prefix of the marker lines.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each section name to its list of lines.
+    """
+
+    sections = OrderedDict()
+    current = None
+    for line in output.splitlines():
+        line = line.rstrip('\r')
+        if line.startswith(prefix):
+            current = sections.setdefault(line[len(prefix):].strip(), [])
+        elif current is not None:
+            current.append(line)
+    return sections
+
+
+def parse_stat(lines):
+    """
+    Parse the ``cpu`` lines of ``/proc/stat`` into jiffy counters.
+
+    >>> parse_stat(['cpu  4 0 2 10 1 0 0 0', 'cpu0 4 0 2 10 1 0 0 0'])['cpu0']
+    [4, 0, 2, 10, 1, 0, 0, 0]
+
+    :param list lines: lines of ``/proc/stat``.
+    :rtype: OrderedDict
+    :return: A dictionary mapping ``cpu`` (aggregate) and ``cpuN`` to the
+        list of counters in :data:`CPU_FIELDS` order.
+    """
+
+    counters = OrderedDict()
+    width = len(CPU_FIELDS)
+    for line in lines:
+        fields = line.split()
+        if not fields or not fields[0].startswith('cpu'):
+            continue
+        if not fields[0][3:].isdigit() and fields[0] != 'cpu':
+            continue
+        values = [int(value) for value in fields[1:width + 1]]
+        counters[fields[0]] = values + [0] * (width - len(values))
+    return counters
+
+
+def parse_meminfo(lines):
+    """
+    Parse ``/proc/meminfo`` into a dictionary of integer values.
+
+    >>> meminfo = parse_meminfo(['MemTotal:  2048 kB', 'HugePages_Total: 0'])
+    >>> meminfo == {'MemTotal': 2048, 'HugePages_Total': 0}
+    True
+
+    :param list lines: lines of ``/proc/meminfo``.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each field name to its value, in kB for
+        the fields the kernel reports in kB.
+    """
+
+    meminfo = OrderedDict()
+    for line in lines:
+        name, sep, value = line.partition(':')
+        fields = value.split()
+        if not sep or not fields or not fields[0].isdigit():
+            continue
+        meminfo[name.strip()] = int(fields[0])
+    return meminfo
+
+
+def parse_pid_stat(line):
+    """
+    Parse ``/proc/<pid>/stat``.
+
+    The command name may contain spaces and parentheses, so the fields are
+    split after its closing parenthesis.
+
+    >>> stat = parse_pid_stat('42 (my (daemon)) S 1 42 42 0 -1 0 0 0 0 0 7 3')
+    >>> print(stat[0], stat[1])
+    S 1
+
+    :param str line: content of the stat file.
+    :rtype: list
+    :return: The fields following the command name, starting with the
+        process state (field 3 in proc(5) numbering).
+    """
+
+    return line[line.rfind(')') + 1:].split()
+
+
+class Sample(object):
+    """
+    One timestamped reading of the node resources.
+
+    :param float timestamp: time of the reading, in seconds since the epoch.
+    :param OrderedDict cpu: :func:`parse_stat` counters, or None.
+    :param OrderedDict meminfo: :func:`parse_meminfo` values, or None.
+    """
+
+    __slots__ = ('timestamp', 'cpu', 'meminfo')
+
+    def __init__(self, timestamp, cpu=None, meminfo=None):
+        self.timestamp = timestamp
+        self.cpu = cpu
+        self.meminfo = meminfo
+
+    def __repr__(self):
+        return 'Sample({!r})'.format(self.timestamp)
+
+
+def cpu_utilisation(before, after):
+    """
+    Compute the utilisation of every CPU between two :func:`parse_stat`
+    readings.
+
+    :param OrderedDict before: first reading.
+    :param OrderedDict after: second reading.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each CPU to the percentage of time spent
+        in each of :data:`CPU_FIELDS`, plus ``busy`` (neither idle nor
+        waiting for I/O).
+    """
+
+    usage = OrderedDict()
+    for cpu, end in after.items():
+        start = before.get(cpu)
+        if start is None:
+            continue
+        deltas = [b - a for a, b in zip(start, end)]
+        total = sum(deltas)
+        deltas.append(total - deltas[3] - deltas[4])
+        scale = 100.0 / total if total > 0 else 0.0
+        breakdown = OrderedDict(
+            zip(CPU_FIELDS + ('busy',), [delta * scale for delta in deltas])
+        )
+        usage[cpu] = breakdown
+    return usage
+
+
+__all__ = [
+    'CPU_FIELDS',
+    'split_sections',
+    'parse_stat',
+    'parse_meminfo',
+    'parse_pid_stat',
+    'Sample',
+    'cpu_utilisation'
+]
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Typed, lazily decoded unit properties from ``systemctl show``.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+
+#: Properties fetched by default by ``get_unit_properties``.
+DEFAULT_PROPERTIES = (
+    'MainPID', 'NRestarts', 'MemoryCurrent', 'CPUUsageNSec',
+    'ActiveEnterTimestampMonotonic', 'Result'
+)
+
+#: systemd prints the maximum 64 bit value for unset counters.
+_UINT64_MAX = 2 ** 64 - 1
+
+
+def decode_property(name, value):
+    """
+    Convert a raw ``systemctl show`` value to a Python value.
+
+    Empty and unset values become None, ``yes``/``no`` become booleans,
+    numbers become integers, and wall clock timestamps and other values are
+    kept as strings.
+
+    >>> decode_property('MemoryCurrent', '[not set]') is None
+    True
+    >>> decode_property('NRestarts', '3')
+    3
+    >>> print(decode_property('ActiveEnterTimestamp', 'Mon 2016-05-02 UTC'))
+    Mon 2016-05-02 UTC
+
+    :param str name: property name.
+    :param str value: raw value.
+    """
+
+    if value == '' or value == '[not set]':
+        return None
+    if value in ('yes', 'no'):
+        return value == 'yes'
+    if name.endswith('Timestamp'):
+        return value
+    digits = value[1:] if value.startswith('-') else value
+    if digits.isdigit():
+        number = int(value)
+        return None if number == _UINT64_MAX else number
+    return value
+
+
+class UnitProperties(object):
+    """
+    Properties of one unit, decoded on first access.
+
+    Properties are available as attributes, ``props.MainPID``, or by name,
+    ``props['MainPID']``. Raw values stay undecoded until read.
+
+    :param str unit: unit name, as requested.
+    :param dict raw: raw ``systemctl show`` values by property name.
+    """
+
+    __slots__ = ('unit', '_raw', '_decoded')
+
+    def __init__(self, unit, raw):
+        self.unit = unit
+        self._raw = raw
+        self._decoded = {}
+
+    def __getitem__(self, name):
+        try:
+            return self._decoded[name]
+        except KeyError:
+            value = decode_property(name, self._raw[name])
+            self._decoded[name] = value
+            return value
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __contains__(self, name):
+        return name in self._raw
+
+    def get(self, name, default=None):
+        """
+        Decoded value of a property, or the default if it was not fetched.
+        """
+
+        if name not in self._raw:
+            return default
+        return self[name]
+
+    def raw(self, name):
+        """
+        Undecoded value of a property.
+        """
+
+        return self._raw[name]
+
+    def __repr__(self):
+        return 'UnitProperties({!r})'.format(self.unit)
+
+
+__all__ = [
+    'DEFAULT_PROPERTIES',
+    'decode_property',
+    'UnitProperties'
+]
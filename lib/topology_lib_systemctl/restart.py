@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Dependency aware planning of parallel unit restarts.
+
+The requested units are ordered by their ``After=``, ``Requires=``,
+``BindsTo=`` and ``PartOf=`` relations among themselves and grouped into
+waves: every unit of a wave only depends on units of earlier waves, so a
+wave can be restarted with a single ``systemctl restart``. A unit that
+requires, is bound to, or is part of another requested unit is restarted
+by systemd along with that unit, so it is not restarted a second time.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+
+#: Properties fetched to build the restart plan.
+DEPENDENCY_PROPERTIES = ('Id', 'After', 'Requires', 'BindsTo', 'PartOf')
+
+#: Properties through which restarting a unit restarts this one.
+CASCADE_PROPERTIES = ('Requires', 'BindsTo', 'PartOf')
+
+
+class RestartPlan(object):
+    """
+    Restart waves of a set of units.
+
+    :param list waves: lists of units, in restart order.
+    :param dict cascaded: mapping of unit to the requested unit whose restart
+        also restarts it.
+    :param list cycles: units involved in dependency cycles, restarted
+        together in the last wave.
+    """
+
+    __slots__ = ('waves', 'cascaded', 'cycles')
+
+    def __init__(self, waves, cascaded, cycles):
+        self.waves = waves
+        self.cascaded = cascaded
+        self.cycles = cycles
+
+    def explicit(self, wave):
+        """
+        Units of a wave that need an explicit restart.
+        """
+
+        return [unit for unit in wave if unit not in self.cascaded]
+
+
+def plan_restart(units, properties):
+    """
+    Build the restart waves of the given units.
+
+    >>> plan = plan_restart(['a', 'b', 'c'], [
+    ...     {'Id': 'a.service'},
+    ...     {'Id': 'b.service', 'After': 'a.service'},
+    ...     {'Id': 'c.service', 'Requires': 'a.service', 'After': 'a.service'},
+    ... ])
+    >>> plan.waves == [['a'], ['b', 'c']], plan.cascaded == {'c': 'a'}
+    (True, True)
+
+    :param list units: requested unit names.
+    :param list properties: :data:`DEPENDENCY_PROPERTIES` of every unit, in
+        the same order, as returned by
+        :func:`topology_lib_systemctl.units.parse_show`.
+    :rtype: RestartPlan
+    """
+
+    # Dependencies name units by Id, which may differ from the requested name
+    names = {}
+    for unit, props in zip(units, properties):
+        names[props.get('Id', unit)] = unit
+        names[unit] = unit
+
+    depends = {}
+    cascaded = {}
+    for unit, props in zip(units, properties):
+        related = set()
+        for prop in ('After',) + CASCADE_PROPERTIES:
+            for other in props.get(prop, '').split():
+                other = names.get(other)
+                if other is None or other == unit:
+                    continue
+                related.add(other)
+                if prop in CASCADE_PROPERTIES and unit not in cascaded:
+                    cascaded[unit] = other
+        depends[unit] = related
+    for unit in units:
+        depends.setdefault(unit, set())
+
+    waves = []
+    done = set()
+    pending = list(units)
+    while pending:
+        wave = [unit for unit in pending if depends[unit] <= done]
+        if not wave:
+            break
+        waves.append(wave)
+        done.update(wave)
+        pending = [unit for unit in pending if unit not in done]
+
+    if pending:
+        waves.append(pending)
+        for unit in pending:
+            cascaded.pop(unit, None)
+
+    return RestartPlan(waves, cascaded, pending)
+
+
+__all__ = [
+    'DEPENDENCY_PROPERTIES',
+    'CASCADE_PROPERTIES',
+    'RestartPlan',
+    'plan_restart'
+]
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Background sampling of the node CPU and memory counters.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import time
+from collections import deque
+from threading import Condition, Event, Thread
+
+from .instrument import send
+from .proc import Sample, split_sections, parse_stat, parse_meminfo
+
+
+#: Node-side command reading both resource files in one round trip.
+SAMPLE_COMMAND = (
+    "echo @@stat; grep '^cpu' /proc/stat; echo @@meminfo; cat /proc/meminfo"
+)
+
+
+def read_sample(enode):
+    """
+    Read ``/proc/stat`` and ``/proc/meminfo`` with a single enode call.
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :rtype: :class:`topology_lib_systemctl.proc.Sample`
+    """
+
+    sections = split_sections(send(enode, SAMPLE_COMMAND, shell='bash'))
+    return Sample(
+        time.time(),
+        parse_stat(sections.get('stat', [])),
+        parse_meminfo(sections.get('meminfo', []))
+    )
+
+
+class ResourceSampler(object):
+    """
+    Poll the node resources from a background thread into a ring buffer.
+
+    The sampler issues enode calls from its own thread, so the engine node
+    must tolerate being used concurrently with the test thread.
+
+    ::
+
+        with ResourceSampler(enode, interval=0.5) as sampler:
+            run_test_step()
+        samples = sampler.snapshot()
+
+    :param topology.platforms.base.BaseNode enode: Engine node to communicate
+        with.
+    :param float interval: seconds between the start of two samples.
+    :param int size: maximum number of samples kept; the oldest are dropped.
+    """
+
+    def __init__(self, enode, interval=1.0, size=600):
+        assert interval > 0, "interval must be positive"
+        assert size > 0, "size must be positive"
+        self.enode = enode
+        self.interval = interval
+        self.error = None
+        self._buffer = deque(maxlen=size)
+        self._taken = 0
+        self._condition = Condition()
+        self._stopping = Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """
+        Whether the sampling thread is alive.
+        """
+
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Start the sampling thread.
+
+        :return: The sampler itself.
+        """
+
+        assert not self.running, "sampler already running"
+        self._stopping.clear()
+        self.error = None
+        self._thread = Thread(target=self._run, name='resource-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop the sampling thread and wait for it to finish.
+
+        :param float timeout: maximum seconds to wait for the thread.
+        """
+
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._condition:
+            self._condition.notify_all()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def snapshot(self):
+        """
+        Return a copy of the samples currently in the ring buffer.
+
+        :rtype: list
+        """
+
+        with self._condition:
+            return list(self._buffer)
+
+    def samples(self, timeout=None):
+        """
+        Iterate over the samples as they are taken.
+
+        Iteration starts at the oldest buffered sample and blocks waiting for
+        new ones. It ends once the sampler is stopped and drained, or when no
+        sample arrives within ``timeout`` seconds. Samples that fall out of
+        the ring buffer before a slow consumer reads them are skipped.
+
+        :param float timeout: maximum seconds to wait for each new sample.
+        :rtype: generator
+        """
+
+        with self._condition:
+            cursor = self._taken - len(self._buffer)
+
+        while True:
+            with self._condition:
+                while self._taken <= cursor and not self._stopping.is_set():
+                    # wait() returns None on Python 2.7, check for a sample
+                    self._condition.wait(timeout)
+                    if timeout is not None and self._taken <= cursor:
+                        break
+                oldest = self._taken - len(self._buffer)
+                cursor = max(cursor, oldest)
+                pending = list(self._buffer)[cursor - oldest:]
+                cursor = self._taken
+            if not pending:
+                return
+            for sample in pending:
+                yield sample
+
+    __iter__ = samples
+
+    def _run(self):
+        while not self._stopping.is_set():
+            started = time.time()
+            try:
+                sample = read_sample(self.enode)
+            except Exception as error:
+                self.error = error
+                break
+            with self._condition:
+                self._buffer.append(sample)
+                self._taken += 1
+                self._condition.notify_all()
+            self._stopping.wait(
+                max(0.0, self.interval - (time.time() - started))
+            )
+        self._stopping.set()
+        with self._condition:
+            self._condition.notify_all()
+
+
+__all__ = [
+    'SAMPLE_COMMAND',
+    'read_sample',
+    'ResourceSampler'
+]
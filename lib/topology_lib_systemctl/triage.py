@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Failure triage of the failed units of a node in a single command.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+from collections import OrderedDict
+
+from .journal import parse_records
+from .proc import split_sections
+from .properties import UnitProperties
+from .units import parse_show
+
+
+#: Properties collected for every failed unit.
+TRIAGE_PROPERTIES = (
+    'Result', 'ExecMainCode', 'ExecMainStatus', 'NRestarts',
+    'StateChangeTimestamp', 'StateChangeTimestampMonotonic'
+)
+
+#: Journal fields kept, on systemd versions supporting ``--output-fields``.
+_JOURNAL_FIELDS = 'MESSAGE,PRIORITY,_SYSTEMD_UNIT,UNIT'
+
+
+class FailedUnit(object):
+    """
+    Triage data of one failed unit.
+
+    :param str name: unit name.
+    :param UnitProperties properties: the :data:`TRIAGE_PROPERTIES`.
+    :param list journal: latest
+        :class:`topology_lib_systemctl.journal.JournalRecord` of the unit,
+        oldest first.
+    """
+
+    __slots__ = ('name', 'properties', 'journal')
+
+    def __init__(self, name, properties, journal):
+        self.name = name
+        self.properties = properties
+        self.journal = journal
+
+    @property
+    def result(self):
+        """
+        Why the unit failed, for example ``exit-code`` or ``timeout``.
+        """
+
+        return self.properties.get('Result')
+
+    @property
+    def exit_status(self):
+        """
+        Exit status, or signal number, of the main process.
+        """
+
+        return self.properties.get('ExecMainStatus')
+
+    @property
+    def restarts(self):
+        """
+        Number of automatic restarts before the unit gave up.
+        """
+
+        return self.properties.get('NRestarts')
+
+    @property
+    def failed_at(self):
+        """
+        Wall clock time the unit entered the failed state, as printed by
+        systemd.
+        """
+
+        return self.properties.get('StateChangeTimestamp')
+
+    @property
+    def failed_at_monotonic(self):
+        """
+        Monotonic time, in microseconds, the unit entered the failed state.
+        """
+
+        return self.properties.get('StateChangeTimestampMonotonic')
+
+    def summary(self):
+        """
+        One line description of the failure, ending with the last journal
+        message of the unit.
+
+        :rtype: str
+        """
+
+        line = '{}: result={} status={} restarts={} failed at {}'.format(
+            self.name, self.result, self.exit_status, self.restarts,
+            self.failed_at
+        )
+        if self.journal:
+            line += ': {}'.format(self.journal[-1].message)
+        return line
+
+    def __repr__(self):
+        return 'FailedUnit({!r}, {!r})'.format(self.name, self.result)
+
+
+def triage_command(lines):
+    """
+    Build the node-side script triaging every failed unit.
+
+    For each failed unit, an ``@@show <unit>`` section holds its
+    :data:`TRIAGE_PROPERTIES` and an ``@@journal <unit>`` section its
+    ``lines`` latest journal entries in JSON.
+
+    :param int lines: journal entries collected per unit.
+    :rtype: str
+    """
+
+    journal = (
+        "journalctl --no-pager --output=json -n {lines} -u $unit"
+    ).format(lines=lines)
+    return (
+        "for unit in $(systemctl list-units --all --state=failed --plain "
+        "--no-legend | awk '{{print ($1 ~ /\\./) ? $1 : $2}}'); do "
+        "echo \"@@show $unit\"; systemctl show {properties} $unit; "
+        "echo \"@@journal $unit\"; "
+        "{journal} --output-fields={fields} 2>/dev/null || {journal}; "
+        "done"
+    ).format(
+        properties=' '.join('-p ' + name for name in TRIAGE_PROPERTIES),
+        journal=journal, fields=_JOURNAL_FIELDS
+    )
+
+
+def parse_triage(output):
+    """
+    Parse the output of :func:`triage_command`.
+
+    :param str output: raw command output.
+    :rtype: OrderedDict
+    :return: A dictionary mapping each failed unit name to its
+        :class:`FailedUnit`, in the order systemd listed them.
+    """
+
+    report = OrderedDict()
+    for name, lines in split_sections(output).items():
+        kind, _, unit = name.partition(' ')
+        if kind == 'show':
+            blocks = parse_show('\n'.join(lines))
+            report[unit] = FailedUnit(
+                unit, UnitProperties(unit, blocks[0] if blocks else {}), []
+            )
+        elif kind == 'journal' and unit in report:
+            report[unit].journal = list(parse_records('\n'.join(lines)))
+    return report
+
+
+__all__ = [
+    'TRIAGE_PROPERTIES',
+    'FailedUnit',
+    'triage_command',
+    'parse_triage'
+]
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Parsing of ``systemctl`` unit tables and unit properties.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import json
+from collections import OrderedDict
+
+
+#: Markers systemd may print in front of a unit name to flag its state.
+_UNIT_MARKERS = ('●', '*')
+
+
+class Unit(object):
+    """
+    Compact record for one line of the systemd unit table.
+
+    :param str name: unit name, for example ``sshd.service``.
+    :param str load: load state (``loaded``, ``not-found``, ...).
+    :param str active: high-level active state (``active``, ``failed``, ...).
+    :param str sub: low-level sub state (``running``, ``exited``, ...).
+    :param str description: human readable description of the unit.
+    """
+
+    __slots__ = ('name', 'load', 'active', 'sub', 'description')
+
+    def __init__(self, name, load, active, sub, description=''):
+        self.name = name
+        self.load = load
+        self.active = active
+        self.sub = sub
+        self.description = description
+
+    def __eq__(self, other):
+        if not isinstance(other, Unit):
+            return NotImplemented
+        return all(
+            getattr(self, slot) == getattr(other, slot)
+            for slot in self.__slots__
+        )
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __repr__(self):
+        return 'Unit({!r}, {!r}, {!r}, {!r})'.format(
+            self.name, self.load, self.active, self.sub
+        )
+
+
+class UnitSnapshot(object):
+    """
+    Unit table at a point in time, indexed by unit name.
+
+    :param list units: :class:`Unit` records.
+    :param dict restarts: optional mapping of unit name to its NRestarts.
+    :param float timestamp: time the snapshot was taken.
+    """
+
+    __slots__ = ('units', 'restarts', 'timestamp')
+
+    def __init__(self, units, restarts=None, timestamp=None):
+        self.units = OrderedDict((unit.name, unit) for unit in units)
+        self.restarts = restarts or {}
+        self.timestamp = timestamp
+
+    def __len__(self):
+        return len(self.units)
+
+    def __contains__(self, name):
+        return name in self.units
+
+    def __getitem__(self, name):
+        return self.units[name]
+
+    def __iter__(self):
+        return iter(self.units.values())
+
+    def diff(self, after):
+        """
+        Compare this snapshot with a later one, in linear time.
+
+        :param UnitSnapshot after: the later snapshot.
+        :rtype: SnapshotDiff
+        """
+
+        before = self.units
+        added = [name for name in after.units if name not in before]
+        removed = [name for name in before if name not in after.units]
+
+        transitions = []
+        for name, unit in after.units.items():
+            old = before.get(name)
+            if old is not None and (
+                    old.load != unit.load or old.active != unit.active or
+                    old.sub != unit.sub):
+                transitions.append(UnitTransition(name, old, unit))
+
+        restarted = OrderedDict()
+        for name, count in after.restarts.items():
+            previous = self.restarts.get(name)
+            if previous is not None and count is not None and \
+                    count > previous:
+                restarted[name] = (previous, count)
+
+        return SnapshotDiff(added, removed, transitions, restarted)
+
+
+class UnitTransition(object):
+    """
+    State change of one unit between two snapshots.
+
+    :param str name: unit name.
+    :param Unit before: record in the earlier snapshot.
+    :param Unit after: record in the later snapshot.
+    """
+
+    __slots__ = ('name', 'before', 'after')
+
+    def __init__(self, name, before, after):
+        self.name = name
+        self.before = before
+        self.after = after
+
+    def __repr__(self):
+        return 'UnitTransition({!r}, {!r} -> {!r})'.format(
+            self.name, self.before.active, self.after.active
+        )
+
+
+class SnapshotDiff(object):
+    """
+    Differences between two :class:`UnitSnapshot`.
+
+    :param list added: names of the units only in the later snapshot.
+    :param list removed: names of the units only in the earlier snapshot.
+    :param list transitions: :class:`UnitTransition` of the units whose
+        load, active or sub state changed.
+    :param OrderedDict restarted: mapping of unit name to its (before,
+        after) restart counts, for the units that restarted.
+    """
+
+    __slots__ = ('added', 'removed', 'transitions', 'restarted')
+
+    def __init__(self, added, removed, transitions, restarted):
+        self.added = added
+        self.removed = removed
+        self.transitions = transitions
+        self.restarted = restarted
+
+    def __bool__(self):
+        return bool(
+            self.added or self.removed or self.transitions or self.restarted
+        )
+
+    __nonzero__ = __bool__
+
+    def changed(self, before=None, after=None):
+        """
+        Transitions filtered by active state, for example
+        ``changed('active', 'failed')``.
+
+        :param str before: active state in the earlier snapshot, any if
+            None.
+        :param str after: active state in the later snapshot, any if None.
+        :rtype: list
+        """
+
+        return [
+            transition for transition in self.transitions
+            if (before is None or transition.before.active == before) and
+            (after is None or transition.after.active == after)
+        ]
+
+
+def parse_units_plain(output):
+    """
+    Parse the output of ``systemctl list-units --plain --no-legend``.
+
+    Lines that do not look like a unit row, such as the echoed command or an
+    empty trailing line, are skipped.
+
+    >>> unit, = parse_units_plain('sshd.service loaded active running SSH')
+    >>> print(unit.name, unit.load, unit.active, unit.sub)
+    sshd.service loaded active running
+
+    :param str output: raw command output.
+    :rtype: list
+    :return: A list of :class:`Unit`.
+    """
+
+    units = []
+    for line in output.splitlines():
+        fields = line.split()
+        if fields and fields[0] in _UNIT_MARKERS:
+            fields.pop(0)
+        if len(fields) < 4 or '.' not in fields[0]:
+            continue
+        if 'systemctl' in fields[:2]:
+            continue
+        units.append(Unit(
+            fields[0], fields[1], fields[2], fields[3], ' '.join(fields[4:])
+        ))
+    return units
+
+
+def parse_units_json(output):
+    """
+    Parse the output of ``systemctl list-units --output=json``.
+
+    :param str output: raw command output.
+    :rtype: list
+    :return: A list of :class:`Unit`.
+    """
+
+    start = output.find('[')
+    end = output.rfind(']')
+    assert start != -1 and end > start, "no JSON unit table in output"
+    return [
+        Unit(
+            entry['unit'], entry['load'], entry['active'], entry['sub'],
+            entry.get('description', '')
+        )
+        for entry in json.loads(output[start:end + 1])
+    ]
+
+
+def parse_show(output):
+    """
+    Parse the output of ``systemctl show`` for one or more units.
+
+    systemd prints one block of ``Key=Value`` lines per unit, in the order
+    the units were given, separated by empty lines.
+
+    >>> blocks = parse_show('Id=a.service\\nActiveState=active\\n\\nId=b')
+    >>> print(' '.join(block['Id'] for block in blocks))
+    a.service b
+
+    :param str output: raw command output.
+    :rtype: list
+    :return: A list with one dictionary of properties per unit.
+    """
+
+    blocks = []
+    current = None
+    for line in output.splitlines():
+        line = line.rstrip('\r')
+        key, sep, value = line.partition('=')
+        if sep and key and key.isalnum():
+            if current is None:
+                current = OrderedDict()
+                blocks.append(current)
+            current[key] = value
+        elif not line.strip():
+            current = None
+    return blocks
+
+
+__all__ = [
+    'Unit',
+    'UnitSnapshot',
+    'UnitTransition',
+    'SnapshotDiff',
+    'parse_units_plain',
+    'parse_units_json',
+    'parse_show'
+]
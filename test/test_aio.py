@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Test suite for the asyncio adapter of topology_lib_systemctl.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pytest import importorskip
+
+from topology_lib_systemctl.aio import AsyncEnode
+
+asyncio = importorskip('asyncio')
+
+
+UNIT_TABLE = (
+    'sshd.service       loaded    active   running OpenSSH Daemon\n'
+    'ops-bad.service    loaded    failed   failed  Broken daemon\n'
+)
+
+
+def slow_enode(command, shell=None):
+    time.sleep(0.2)
+    return UNIT_TABLE
+
+
+def run_loop(function):
+    """
+    Run a function building an awaitable on a fresh event loop.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(
+            asyncio.ensure_future(function(loop), loop=loop)
+        )
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_async_enode():
+    """
+    Check that awaitable library calls overlap across nodes without blocking
+    the event loop.
+    """
+    ticks = []
+
+    def sweep(loop):
+        for delay in (0, 0.05, 0.1):
+            loop.call_later(delay, lambda: ticks.append(time.time()))
+        nodes = [AsyncEnode(slow_enode) for _ in range(3)]
+        return asyncio.gather(
+            *(node.check_failed_services() for node in nodes)
+        )
+
+    start = time.time()
+    results = run_loop(sweep)
+
+    assert time.time() - start < 0.5
+    assert results == [['ops-bad.service']] * 3
+    assert len(ticks) == 3
+    assert ticks[-1] - ticks[0] < 0.15
+
+
+def test_async_enode_busy_node():
+    """
+    Check that calls queued on a busy node do not hold the executor workers
+    needed by another node.
+    """
+    executor = ThreadPoolExecutor(max_workers=4)
+    busy = AsyncEnode(slow_enode, executor=executor)
+    idle = AsyncEnode(slow_enode, executor=executor)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        queued = [busy.check_failed_services() for _ in range(8)]
+        start = time.time()
+        loop.run_until_complete(idle.check_failed_services())
+        elapsed = time.time() - start
+
+        for future in queued:
+            future.cancel()
+        # Let the call already running on the busy node finish
+        loop.run_until_complete(asyncio.sleep(0.3))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+        executor.shutdown()
+
+    assert elapsed < 0.35
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2016 Hewlett Packard Enterprise Development LP
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+
+"""
+Benchmark suite for module topology_lib_systemctl.
+
+Every case runs a library function against a
+:class:`topology_lib_systemctl.fake.ReplayEnode` and measures its enode
+round trips, the time spent outside of the enode (command building and
+parsing) and its peak memory allocation. The measurements are compared with
+``benchmark_baseline.json``:
+
+- Round trips must not exceed the baseline.
+- With ``BENCHMARK_STRICT=1``, parse time must stay within
+  ``BENCHMARK_TOLERANCE`` (default 3) times the baseline, plus one
+  millisecond of timer noise, and peak memory within 1.5 times the baseline
+  plus 16 KiB. Timings depend on the machine and on tracers such as coverage,
+  so they are only reported by default.
+
+The module is skipped on Pythons without ``tracemalloc`` (before 3.4).
+
+Run with ``BENCHMARK_UPDATE=1`` to rewrite the baseline, and with
+``BENCHMARK_REPORT=<file>`` to write the measurements as a table.
+"""
+
+from __future__ import unicode_literals, absolute_import
+from __future__ import print_function, division
+
+import io
+import gc
+import json
+import time
+from os import environ
+from os.path import join, dirname, abspath
+
+from pytest import fixture, mark, importorskip
+
+from topology_lib_systemctl import library
+from topology_lib_systemctl.batch import Batch
+from topology_lib_systemctl.fake import ReplayEnode
+
+tracemalloc = importorskip('tracemalloc')
+
+
+BASELINE = join(dirname(abspath(__file__)), 'benchmark_baseline.json')
+TOLERANCE = float(environ.get('BENCHMARK_TOLERANCE', '3'))
+STRICT = bool(environ.get('BENCHMARK_STRICT'))
+UNIT_COUNTS = (10, 100, 1000, 10000)
+SERVICES = ['unit-{}.service'.format(index) for index in range(30)]
+DAEMONS = ['daemon-{}'.format(index) for index in range(30)]
+
+
+def cached_sweep(enode):
+    library.enable_unit_cache(enode, ttl=60)
+    try:
+        library.list_all_units(enode)
+        library.list_loaded_units(enode)
+        library.check_failed_services(enode)
+    finally:
+        library.disable_unit_cache(enode)
+
+
+def batched_health_check(enode):
+    with Batch(enode) as batch:
+        calls = [
+            batch.check_failed_services(),
+            batch.get_memory_usage(),
+            batch.get_cpu_usage(window=0.1),
+            batch.list_loaded_units(),
+        ]
+    return [call.result() for call in calls]
+
+
+CASES = [
+    ('list_units', library.list_units),
+    ('list_units_json', lambda enode: library.list_units(enode, 'json')),
+    ('list_all_units', library.list_all_units),
+    ('list_loaded_units', library.list_loaded_units),
+    ('check_failed_services', library.check_failed_services),
+    ('cached_sweep', cached_sweep),
+]
+
+FIXED_CASES = [
+    ('get_memory_usage', library.get_memory_usage),
+    ('get_cpu_usage', library.get_cpu_usage),
+    ('get_cpu_usage_window',
+     lambda enode: library.get_cpu_usage(enode, window=0.1)),
+    ('reload_service_units',
+     lambda enode: library.reload_service_units(enode, SERVICES)),
+    ('reload_service_units_batch',
+     lambda enode: library.reload_service_units(enode, SERVICES, True)),
+    ('kill_daemons', lambda enode: library.kill_daemons(enode, DAEMONS)),
+    ('wait_for_units', lambda enode: library.wait_for_units(enode, SERVICES)),
+    ('batched_health_check', batched_health_check),
+]
+
+
+def measure(function, units, repeat=3):
+    """
+    Measure a library function against a replaying node of the given size.
+    """
+
+    enode = ReplayEnode(units=units, cores=64)
+    function(enode)
+    round_trips = enode.round_trips
+
+    parse_time = None
+    for _ in range(repeat):
+        gc.collect()
+        enode.reset()
+        start = time.time()
+        function(enode)
+        elapsed = time.time() - start - enode.reply_time
+        parse_time = elapsed if parse_time is None else min(
+            parse_time, elapsed
+        )
+
+    tracemalloc.start()
+    try:
+        function(enode)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'round_trips': round_trips,
+        'parse_time': parse_time,
+        'peak_memory': peak_memory
+    }
+
+
+@fixture(scope='module')
+def baseline():
+    """
+    Load the stored baseline and, on request, store the new measurements.
+    """
+
+    try:
+        with io.open(BASELINE, encoding='utf-8') as fd:
+            stored = json.load(fd)
+    except IOError:
+        stored = {}
+    measured = {}
+    yield stored, measured
+
+    if environ.get('BENCHMARK_UPDATE'):
+        stored.update(measured)
+        with io.open(BASELINE, 'w', encoding='utf-8') as fd:
+            fd.write(json.dumps(stored, indent=4, sort_keys=True) + '\n')
+    report = environ.get('BENCHMARK_REPORT')
+    if report:
+        with io.open(report, 'w', encoding='utf-8') as fd:
+            fd.write('{:<40} {:>6} {:>12} {:>12}\n'.format(
+                'case', 'trips', 'parse (ms)', 'peak (KiB)'
+            ))
+            for case, result in sorted(measured.items()):
+                fd.write('{:<40} {:>6} {:>12.3f} {:>12.1f}\n'.format(
+                    case, result['round_trips'], result['parse_time'] * 1e3,
+                    result['peak_memory'] / 1024
+                ))
+
+
+def check(baseline, case, function, units):
+    stored, measured = baseline
+    result = measured[case] = measure(function, units)
+    expected = stored.get(case)
+    if expected is None or environ.get('BENCHMARK_UPDATE'):
+        return
+
+    assert result['round_trips'] <= expected['round_trips'], \
+        '{} round trips regressed'.format(case)
+    if not STRICT:
+        return
+    assert result['parse_time'] <= \
+        expected['parse_time'] * TOLERANCE + 0.001, \
+        '{} parse time regressed'.format(case)
+    assert result['peak_memory'] <= \
+        expected['peak_memory'] * 1.5 + 16384, \
+        '{} peak memory regressed'.format(case)
+
+
+@mark.parametrize('units', UNIT_COUNTS)
+@mark.parametrize('name,function', CASES, ids=[name for name, _ in CASES])
+def test_unit_table(baseline, name, function, units):
+    """
+    Benchmark the unit table functions for growing node sizes.
+    """
+    check(baseline, '{}[{}]'.format(name, units), function, units)
+
+
+@mark.parametrize(
+    'name,function', FIXED_CASES, ids=[name for name, _ in FIXED_CASES]
+)
+def test_fixed_size(baseline, name, function):
+    """
+    Benchmark the functions whose cost does not depend on the unit table.
+    """
+    check(baseline, name, function, 100)
+
+
+def test_replay_latency():
+    """
+    Check that batching pays off once the round trip latency is simulated.
+    """
+    serial = ReplayEnode(latency=0.005)
+    start = time.time()
+    library.reload_service_units(serial, SERVICES)
+    serial_time = time.time() - start
+
+    batched = ReplayEnode(latency=0.005)
+    start = time.time()
+    library.reload_service_units(batched, SERVICES, batch=True)
+    batched_time = time.time() - start
+
+    assert serial.round_trips == len(SERVICES)
+    assert batched.round_trips == 1
+    assert batched_time < serial_time
@@ -22,11 +22,978 @@ Test suite for module topology_lib_systemctl.
 from __future__ import unicode_literals, absolute_import
 from __future__ import print_function, division
 
+import io
+import os
+import gzip
+import time
+import base64
+from collections import OrderedDict
+
+import pytest
+
+from topology_lib_systemctl import library
+from topology_lib_systemctl.batch import Batch
+from topology_lib_systemctl.fake import ReplayEnode
+from topology_lib_systemctl.analyze import diff_boots
+from topology_lib_systemctl.fanout import fan_out
+from topology_lib_systemctl.instrument import BUCKETS, instrumented
+from topology_lib_systemctl.local import LocalEnode
+from topology_lib_systemctl.proc import parse_pid_stat
+from topology_lib_systemctl.agent import SamplingAgent
+from topology_lib_systemctl.sampler import ResourceSampler
+
 # Add your test cases here.
 
 
+class FakeEnode(object):
+    """
+    Engine node double that records the commands it receives and answers
+    them with canned outputs.
+    """
+
+    def __init__(self, *outputs):
+        self.outputs = list(outputs)
+        self.commands = []
+
+    def __call__(self, command, shell=None):
+        self.commands.append(command)
+        return self.outputs.pop(0)
+
+
 def test_your_test_case():
     """
     Document your test case here.
     """
     pass
+
+
+def test_reload_service_units_batch():
+    """
+    Check that a batched restart uses one enode call and reports every unit.
+    """
+    enode = FakeEnode(
+        '@@restart sshd.service 0 1000000000 1500000000\n'
+        '@@restart bad.service 5 1500000000 1600000000\n'
+    )
+    results = library.reload_service_units(
+        enode, ['sshd.service', 'bad.service'], batch=True
+    )
+
+    assert len(enode.commands) == 1
+    assert list(results) == ['sshd.service', 'bad.service']
+    assert results['sshd.service'] == {
+        'ok': True, 'exit_code': 0, 'elapsed': 0.5
+    }
+    assert not results['bad.service']['ok']
+    assert results['bad.service']['exit_code'] == 5
+
+
+def test_reload_service_units_no_block():
+    """
+    Check that a no-block batched restart reports the post-wait state.
+    """
+    enode = FakeEnode(
+        '@@queued sshd.service 0\n'
+        '@@queued bad.service 0\n'
+        '@@waited 1000000000 3000000000\n'
+        '@@state sshd.service active\n'
+        '@@state bad.service failed\n'
+    )
+    results = library.reload_service_units(
+        enode, ['sshd.service', 'bad.service'], batch=True, no_block=True
+    )
+
+    assert len(enode.commands) == 1
+    assert '--no-block' in enode.commands[0]
+    assert results['sshd.service']['ok']
+    assert results['sshd.service']['elapsed'] == 2.0
+    assert results['bad.service']['state'] == 'failed'
+    assert not results['bad.service']['ok']
+
+
+UNIT_TABLE = (
+    'systemctl list-units --all --full --no-legend --no-pager --plain\n'
+    'sshd.service       loaded    active   running OpenSSH Daemon\n'
+    'ops-bad.service    loaded    failed   failed  Broken daemon\n'
+    'home.mount         not-found inactive dead    home.mount\n'
+    '\n'
+)
+
+
+def test_list_units_filters():
+    """
+    Check that one unit table answers all the unit listing functions.
+    """
+    enode = FakeEnode(UNIT_TABLE)
+    units = library.list_units(enode)
+
+    assert len(enode.commands) == 1
+    assert [unit.name for unit in units] == [
+        'sshd.service', 'ops-bad.service', 'home.mount'
+    ]
+    assert units[0].sub == 'running'
+    assert units[0].description == 'OpenSSH Daemon'
+    assert library.list_all_units(enode, units=units) == [
+        'sshd.service', 'ops-bad.service', 'home.mount'
+    ]
+    assert library.list_loaded_units(enode, units=units) == [
+        'sshd.service', 'ops-bad.service'
+    ]
+    assert library.check_failed_services(enode, units=units) == [
+        'ops-bad.service'
+    ]
+    assert len(enode.commands) == 1
+
+
+def test_list_units_json():
+    """
+    Check parsing of the JSON unit table.
+    """
+    enode = FakeEnode(
+        '[{"unit":"sshd.service","load":"loaded","active":"active",'
+        '"sub":"running","description":"OpenSSH Daemon"}]'
+    )
+    units = library.list_units(enode, output='json')
+
+    assert '--output=json' in enode.commands[0]
+    assert units[0].name == 'sshd.service'
+    assert units[0].active == 'active'
+
+
+def test_unit_cache():
+    """
+    Check that the unit cache serves repeated listings and is invalidated by
+    mutating calls.
+    """
+    enode = FakeEnode(
+        UNIT_TABLE, '@@pids ops-bad 42\n@@sent ops-bad 0\n', UNIT_TABLE
+    )
+    library.enable_unit_cache(enode, ttl=60)
+    try:
+        assert library.list_all_units(enode)
+        assert library.list_loaded_units(enode)
+        assert library.check_failed_services(enode) == ['ops-bad.service']
+        assert len(enode.commands) == 1
+
+        library.kill_daemons(enode, ['ops-bad'])
+        assert library.list_all_units(enode)
+        assert len(enode.commands) == 3
+
+        assert library.unit_cache_stats(enode) == {
+            'hits': 2, 'misses': 2, 'ttl': 60, 'entries': 1
+        }
+    finally:
+        library.disable_unit_cache(enode)
+    assert library.unit_cache_stats(enode) is None
+
+
+def test_get_cpu_usage_window():
+    """
+    Check that a windowed CPU sample is taken in one call and broken down per
+    core.
+    """
+    enode = FakeEnode(
+        '@@before\n'
+        'cpu  100 0 100 700 50 0 0 50\n'
+        'cpu0 50 0 50 350 25 0 0 25\n'
+        '@@after\n'
+        'cpu  200 0 150 800 100 0 0 50\n'
+        'cpu0 150 0 50 350 25 0 0 25\n'
+    )
+    usage = library.get_cpu_usage(enode, window=0.5)
+
+    assert len(enode.commands) == 1
+    assert 'sleep 0.5' in enode.commands[0]
+    assert usage['cpu']['user'] == 100 * (100.0 / 300)
+    assert usage['cpu']['iowait'] == 50 * (100.0 / 300)
+    assert usage['cpu']['busy'] == 50.0
+    assert usage['cpu0']['user'] == 100.0
+    assert usage['cpu0']['busy'] == 100.0
+
+
+def test_resource_sampler():
+    """
+    Check that the background sampler fills its ring buffer and streams the
+    samples to a consumer.
+    """
+    reading = (
+        '@@stat\ncpu  1 0 1 8 0 0 0 0\n'
+        '@@meminfo\nMemTotal: 2048 kB\nMemAvailable: 1024 kB\n'
+    )
+
+    def enode(command, shell=None):
+        return reading
+
+    sampler = ResourceSampler(enode, interval=0.001, size=3)
+    with sampler:
+        samples = []
+        for sample in sampler:
+            samples.append(sample)
+            if len(samples) == 5:
+                break
+
+    assert not sampler.running
+    assert sampler.error is None
+    assert len(sampler.snapshot()) == 3
+    assert samples[0].cpu['cpu'] == [1, 0, 1, 8, 0, 0, 0, 0]
+    assert samples[-1].meminfo['MemAvailable'] == 1024
+    assert [s.timestamp for s in samples] == sorted(
+        s.timestamp for s in samples
+    )
+
+    # With a timeout, iteration goes on as long as samples keep arriving
+    with ResourceSampler(enode, interval=0.01, size=10) as sampler:
+        timed = [
+            sample for _, sample in zip(range(4), sampler.samples(timeout=1))
+        ]
+    assert len(timed) == 4
+
+
+def test_memory_leak_trend():
+    """
+    Check that a steady growth hidden in page cache churn is detected.
+    """
+    output = ''
+    for second in range(10):
+        output += (
+            '@@sample {}.5\n'
+            'MemTotal: 100000 kB\n'
+            'MemFree: {} kB\n'
+            'MemAvailable: {} kB\n'
+        ).format(1000 + second, 5000 * (second % 2), 50000 - 100 * second)
+    enode = FakeEnode(output)
+    samples = library.collect_memory_samples(enode, 10, 1)
+
+    assert len(enode.commands) == 1
+    assert len(samples) == 10
+    assert samples[0].timestamp == 1000.5
+
+    report = library.memory_leak_trend(enode, samples, rate_threshold=50)
+    assert report['verdict'] == 1
+    assert abs(report['rate'] - 100) < 1e-9
+    assert abs(report['confidence'] - 1) < 1e-9
+    assert report['span'] == 9
+
+    report = library.memory_leak_trend(enode, samples, rate_threshold=150)
+    assert report['verdict'] == 0
+
+
+def test_get_daemons_usage():
+    """
+    Check that per-daemon usage is aggregated over all of its processes,
+    skipping the ones that exit while they are read.
+    """
+    stat = '{} (ops-sysd) S 1 1 1 0 -1 0 0 0 0 0 {} {} 0 0'
+    enode = FakeEnode(
+        '@@daemon ops-sysd\n'
+        '@@status ops-sysd 10\nVmRSS: 100 kB\nVmSwap: 1 kB\nThreads: 2\n'
+        '@@stat ops-sysd 10\n' + stat.format(10, 7, 3) + '\n'
+        '@@smaps ops-sysd 10\nPss: 60 kB\n'
+        '@@status ops-sysd 11\nVmRSS: 50 kB\nVmSwap: 0 kB\nThreads: 1\n'
+        '@@stat ops-sysd 11\n' + stat.format(11, 1, 1) + '\n'
+        '@@smaps ops-sysd 11\nPss: 40 kB\n'
+        '@@status ops-sysd 12\n'
+        '@@stat ops-sysd 12\ncat: /proc/12/stat: No such file or directory\n'
+        '@@smaps ops-sysd 12\n'
+        '@@status ops-sysd 13\nVmRSS: 0 kB\nThreads: 1\n'
+        '@@stat ops-sysd 13\n'
+        '@@smaps ops-sysd 13\n'
+        '@@daemon missing\n'
+    )
+    usage = library.get_daemons_usage(enode, ['ops-sysd', 'missing'])
+
+    assert len(enode.commands) == 1
+    assert usage['ops-sysd'] == {
+        'pids': [10, 11, 13], 'rss': 150, 'pss': 100, 'swap': 1,
+        'threads': 4, 'utime': 8, 'stime': 4
+    }
+    assert usage['missing']['pids'] == []
+    assert usage['missing']['pss'] is None
+
+
+def test_fan_out():
+    """
+    Check that a fan-out runs nodes concurrently and keeps errors per node.
+    """
+    def slow_enode(command, shell=None):
+        time.sleep(0.2)
+        return UNIT_TABLE
+
+    def broken_enode(command, shell=None):
+        raise RuntimeError('connection lost')
+
+    enodes = OrderedDict(
+        [('sw1', slow_enode), ('sw2', slow_enode), ('sw3', broken_enode)]
+    )
+    report = fan_out('check_failed_services', enodes)
+
+    assert list(report.results) == ['sw1', 'sw2', 'sw3']
+    assert report.results['sw1'].value == ['ops-bad.service']
+    assert not report.results['sw3'].ok
+    assert list(report.failed) == ['sw3']
+    assert report.elapsed < report.serial_time
+
+
+def test_cpu_load():
+    """
+    Check that the load is started and stopped with one call each, and that
+    the achieved load is reported per core.
+    """
+    enode = FakeEnode(
+        '@@pid 0 200\n@@pid 2 201\n'
+        '@@stat\ncpu0 0 0 0 100 0 0 0 0\ncpu2 0 0 0 100 0 0 0 0\n',
+        '@@stat\ncpu0 60 0 0 140 0 0 0 0\ncpu2 55 0 5 140 0 0 0 0\n'
+    )
+    load = library.start_cpu_load(enode, cores=[0, 2], percent=60)
+
+    assert load.cores == [0, 2]
+    assert 'taskset -c $core' in enode.commands[0]
+    assert 'sleep 0.060' in enode.commands[0]
+    assert library.stop_cpu_load(enode, load) == OrderedDict(
+        [(0, 60.0), (2, 60.0)]
+    )
+    assert '-- -$pid' in enode.commands[1]
+    assert '200 201' in enode.commands[1]
+
+
+def live_processes(pgid):
+    """
+    PIDs of the processes of a process group that have not exited.
+    """
+    pids = []
+    for entry in os.listdir('/proc'):
+        try:
+            with open('/proc/{}/stat'.format(entry)) as fd:
+                stat = parse_pid_stat(fd.read())
+        except (IOError, OSError):
+            continue
+        if int(stat[2]) == pgid and stat[0] != 'Z':
+            pids.append(int(entry))
+    return pids
+
+
+@pytest.mark.parametrize('job_control', [False, True])
+def test_cpu_load_local(job_control):
+    """
+    Check that stopping the load kills every load process on the node, also
+    when the node shell has job control enabled.
+    """
+    with LocalEnode() as enode:
+        if job_control:
+            enode('set -m')
+        load = library.start_cpu_load(enode, cores=[0], percent=50)
+        pgid = load.pids[0]
+        time.sleep(0.2)
+        assert live_processes(pgid)
+        load.stop()
+        time.sleep(0.2)
+        assert live_processes(pgid) == []
+
+
+def test_signal_daemons():
+    """
+    Check that every daemon is signalled in one call and verified, even
+    after a daemon without processes.
+    """
+    enode = FakeEnode(
+        '@@pids missing\n'
+        '@@pids ops-sysd 10 11\n'
+        '@@sent ops-sysd 0\n'
+        '@@state ops-sysd 10 T\n'
+        '@@state ops-sysd 11 S\n'
+    )
+    report = library.signal_daemons(enode, ['missing', 'ops-sysd'], 'STOP')
+
+    assert len(enode.commands) == 1
+    assert 'kill -STOP $pids' in enode.commands[0]
+    assert report['missing']['pids'] == []
+    assert not report['missing']['delivered']
+    assert report['ops-sysd']['pids'] == [10, 11]
+    assert report['ops-sysd']['delivered']
+    assert report['ops-sysd']['states'] == OrderedDict([(10, 'T'), (11, 'S')])
+    assert not report['ops-sysd']['verified']
+
+
+def test_kill_daemons_cgroup():
+    """
+    Check that killing by cgroup verifies every process is gone.
+    """
+    enode = FakeEnode(
+        '@@pids ops-sysd.service 10 12\n'
+        '@@sent ops-sysd.service 0\n'
+        '@@state ops-sysd.service 10 \n'
+        '@@state ops-sysd.service 12 Z\n'
+    )
+    report = library.kill_daemons(enode, ['ops-sysd.service'], cgroup=True)
+
+    assert 'cgroup.procs' in enode.commands[0]
+    assert report['ops-sysd.service']['states'] == OrderedDict(
+        [(10, None), (12, 'Z')]
+    )
+    assert report['ops-sysd.service']['verified']
+
+
+def test_wait_for_units():
+    """
+    Check that waiting polls all units at once until they converge.
+    """
+    starting = (
+        'Id=sshd.service\nActiveState=active\nSubState=running\n\n'
+        'Id=ops-sysd.service\nActiveState=activating\nSubState=start\n'
+    )
+    started = starting.replace('activating', 'active').replace(
+        '=start', '=running'
+    )
+    enode = FakeEnode(starting, starting, started)
+    result = library.wait_for_units(
+        enode, ['sshd', 'ops-sysd'], timeout=5, interval=0.01
+    )
+
+    assert result['converged']
+    assert result['polls'] == 3
+    assert len(enode.commands) == 3
+    assert result['states']['ops-sysd'] == ('active', 'running')
+    assert result['stuck'] == {}
+
+
+def test_wait_for_units_stuck():
+    """
+    Check that a failed unit is reported as stuck when failing fast.
+    """
+    enode = FakeEnode(
+        'Id=sshd.service\nActiveState=active\nSubState=running\n\n'
+        'Id=ops-bad.service\nActiveState=failed\nSubState=failed\n'
+    )
+    result = library.wait_for_units(
+        enode, ['sshd.service', 'ops-bad.service'], fail_fast=True
+    )
+
+    assert not result['converged']
+    assert result['polls'] == 1
+    assert result['stuck'] == {'ops-bad.service': ('failed', 'failed')}
+
+
+def test_instrumentation():
+    """
+    Check that commands are recorded under the public function that issued
+    them.
+    """
+    records = []
+    enode = FakeEnode(UNIT_TABLE, UNIT_TABLE)
+    with instrumented(sink=records.append) as instrumentation:
+        library.check_failed_services(enode)
+        library.list_all_units(enode)
+    library.list_all_units(FakeEnode(UNIT_TABLE))
+
+    assert [record.function for record in records] == [
+        'check_failed_services', 'list_all_units'
+    ]
+    assert records[0].output_size == len(UNIT_TABLE)
+    summary = instrumentation.summary()
+    assert set(summary) == {'check_failed_services', 'list_all_units'}
+    assert summary['list_all_units']['calls'] == 1
+    assert summary['list_all_units']['p95'] <= BUCKETS[0]
+
+
+def test_local_enode(tmpdir):
+    """
+    Check that the local backend reuses one shell and serves /proc from a
+    fixture directory.
+    """
+    tmpdir.join('meminfo').write(
+        'MemTotal: 2048 kB\nMemFree: 1024 kB\nCached: 512 kB\n'
+    )
+    with LocalEnode(proc_root=str(tmpdir)) as enode:
+        assert enode('echo $$') == enode('echo $$')
+        assert library.get_memory_usage(enode) == {
+            'memTotal': '2048', 'memFree': '1024', 'cached': '512'
+        }
+        enode('false')
+        assert enode.exit_status == 1
+
+
+BOOT = (
+    '@@time\n'
+    'Startup finished in 2.5s (kernel) + 1min 5s (userspace) = 1min 7.5s\n'
+    '@@blame\n'
+    '     40.2s ops-sysd.service\n'
+    '1min 2.1s ops-init.service\n'
+    '    300ms sshd.service\n'
+    '@@chain\n'
+    'The time when unit became active or started is printed after the "@"'
+    ' character.\n'
+    'multi-user.target @1min 5s\n'
+    '└─ops-init.service @2.9s +1min 2.1s\n'
+    '  └─basic.target @2.8s\n'
+)
+
+
+def test_analyze_boot():
+    """
+    Check that the startup report is parsed and compared between boots.
+    """
+    before = library.analyze_boot(FakeEnode(BOOT))
+
+    assert before.stages == OrderedDict(
+        [('kernel', 2.5), ('userspace', 65.0), ('total', 67.5)]
+    )
+    assert before.blame['ops-init.service'] == 62.1
+    assert before.critical_path == [
+        'basic.target', 'ops-init.service', 'multi-user.target'
+    ]
+    assert before.chain[1].duration == 62.1
+
+    after = library.analyze_boot(FakeEnode(
+        BOOT.replace('40.2s', '45.2s').replace('    300ms sshd.service\n', '')
+    ))
+    diff = diff_boots(before, after, threshold=1)
+    assert list(diff['units']) == ['ops-sysd.service']
+    assert diff['units']['ops-sysd.service'][2] == 45.2 - 40.2
+    assert diff['removed'] == ['sshd.service']
+    assert diff['stages']['total'] == (67.5, 67.5, 0.0)
+
+
+def test_parallel_restart_units():
+    """
+    Check that units are restarted in dependency waves with two enode calls.
+    """
+    enode = FakeEnode(
+        'Id=ops-db.service\n\n'
+        'Id=ops-sysd.service\nAfter=ops-db.service basic.target\n\n'
+        'Id=ops-cli.service\nRequires=ops-db.service\nAfter=ops-db.service\n'
+        '\n'
+        'Id=sshd.service\n',
+        '@@wave 0 0 1000000000 2000000000\n'
+        '@@wave 1 0 2000000000 2500000000\n'
+        '@@total 1000000000 2500000000\n'
+        '@@show\n'
+        'Id=ops-db.service\nInactiveExitTimestampMonotonic=1000000\n'
+        'ActiveEnterTimestampMonotonic=2000000\n\n'
+        'Id=ops-sysd.service\nInactiveExitTimestampMonotonic=2000000\n'
+        'ActiveEnterTimestampMonotonic=2500000\n\n'
+        'Id=ops-cli.service\nInactiveExitTimestampMonotonic=2000000\n'
+        'ActiveEnterTimestampMonotonic=2400000\n\n'
+        'Id=sshd.service\nInactiveExitTimestampMonotonic=1000000\n'
+        'ActiveEnterTimestampMonotonic=1300000\n'
+    )
+    result = library.parallel_restart_units(
+        enode, ['ops-db', 'ops-sysd', 'ops-cli', 'sshd']
+    )
+
+    assert len(enode.commands) == 2
+    assert 'systemctl restart ops-db sshd;' in enode.commands[1]
+    assert 'systemctl restart ops-sysd;' in enode.commands[1]
+    assert [wave['units'] for wave in result['waves']] == [
+        ['ops-db', 'sshd'], ['ops-sysd', 'ops-cli']
+    ]
+    assert result['cascaded'] == {'ops-cli': 'ops-db'}
+    assert result['waves'][1]['duration'] == 0.5
+    assert result['total'] == 1.5
+    assert abs(result['serial'] - 2.2) < 1e-9
+    assert abs(result['saved'] - 0.7) < 1e-9
+
+
+def journal_entry(cursor, message):
+    return (
+        '{{"__CURSOR":"s=1;i={}","__REALTIME_TIMESTAMP":"1500000000000000",'
+        '"_SYSTEMD_UNIT":"ops-sysd.service","PRIORITY":"3",'
+        '"MESSAGE":{}}}\n'
+    ).format(cursor, message)
+
+
+def test_read_journal():
+    """
+    Check that the journal is read incrementally from the last consumed
+    cursor.
+    """
+    enode = FakeEnode(
+        '@@tail\n' + journal_entry(9, '"other"') + '@@entries\n' +
+        journal_entry(1, '"starting"') + journal_entry(2, '"crashed"'),
+        journal_entry(2, '"crashed"'),
+        journal_entry(3, '[104, 105]'),
+    )
+    try:
+        records = library.read_journal(enode, ['ops-sysd.service'])
+        assert len(enode.commands) == 1
+        first = next(records)
+        assert first.message == 'starting'
+        assert first.priority == 3
+        assert first.timestamp == 1500000000.0
+        assert first.unit == 'ops-sysd.service'
+        assert ' -n 10' in enode.commands[0]
+
+        records = library.read_journal(enode, ['ops-sysd.service'])
+        assert [r.message for r in records] == ['crashed']
+        assert "--after-cursor='s=1;i=1'" in enode.commands[1]
+
+        records = library.read_journal(enode, ['ops-sysd.service'])
+        assert [r.message for r in records] == ['hi']
+        assert "--after-cursor='s=1;i=2'" in enode.commands[2]
+    finally:
+        library.reset_journal_cursors(enode)
+
+
+def test_read_journal_without_entries():
+    """
+    Check that a unit without entries yet is read from the end of the
+    journal on the next call, and that arguments are checked on call.
+    """
+    enode = FakeEnode(
+        '@@tail\n' + journal_entry(9, '"other"') + '@@entries\n',
+        journal_entry(10, '"started"'),
+    )
+    try:
+        assert list(library.read_journal(enode, ['ops-sysd.service'])) == []
+        records = library.read_journal(enode, ['ops-sysd.service'])
+        assert [r.message for r in records] == ['started']
+        assert "--after-cursor='s=1;i=9'" in enode.commands[1]
+    finally:
+        library.reset_journal_cursors(enode)
+
+    with pytest.raises(AssertionError):
+        library.read_journal(enode, [])
+
+
+def test_get_unit_properties():
+    """
+    Check that properties of many units are fetched at once and typed.
+    """
+    enode = FakeEnode(
+        'MainPID=42\nNRestarts=2\nMemoryCurrent=1048576\n'
+        'CPUUsageNSec=18446744073709551615\n'
+        'ActiveEnterTimestampMonotonic=5000000\nResult=success\n\n'
+        'MainPID=0\nNRestarts=0\nMemoryCurrent=[not set]\n'
+        'CPUUsageNSec=[not set]\nActiveEnterTimestampMonotonic=0\n'
+        'Result=exit-code\n'
+    )
+    props = library.get_unit_properties(enode, ['ops-sysd', 'ops-bad'])
+
+    assert len(enode.commands) == 1
+    assert '-p MainPID -p NRestarts' in enode.commands[0]
+    sysd = props['ops-sysd']
+    assert sysd.MainPID == 42
+    assert sysd['NRestarts'] == 2
+    assert sysd.MemoryCurrent == 1048576
+    assert sysd.CPUUsageNSec is None
+    assert sysd.raw('CPUUsageNSec') == '18446744073709551615'
+    assert props['ops-bad'].Result == 'exit-code'
+    assert props['ops-bad'].MemoryCurrent is None
+    assert props['ops-bad'].get('ExecMainStatus', -1) == -1
+
+
+def test_unit_snapshot_diff():
+    """
+    Check that snapshots report added, removed, transitioned and restarted
+    units.
+    """
+    later_table = UNIT_TABLE.replace(
+        'sshd.service       loaded    active   running',
+        'sshd.service       loaded    failed   failed '
+    ).replace('home.mount', 'tmp.mount')
+    enode = FakeEnode(
+        UNIT_TABLE, 'NRestarts=0\n\nNRestarts=1\n',
+        later_table, 'NRestarts=0\n\nNRestarts=3\n'
+    )
+    before = library.take_unit_snapshot(enode, restarts=True)
+    after = library.take_unit_snapshot(enode, restarts=True)
+
+    assert 'sshd.service' in before
+    assert before['sshd.service'].active == 'active'
+    assert enode.commands[1].endswith('sshd.service ops-bad.service')
+
+    diff = before.diff(after)
+    assert diff
+    assert diff.added == ['tmp.mount']
+    assert diff.removed == ['home.mount']
+    assert [t.name for t in diff.changed('active', 'failed')] == [
+        'sshd.service'
+    ]
+    assert diff.restarted == {'ops-bad.service': (1, 3)}
+    assert not after.diff(after)
+
+
+def test_get_units_cgroup_usage():
+    """
+    Check cgroup v2 and v1 readings and the rates between two readings.
+    """
+    def reading(timestamp, memory, usec, rbytes):
+        return (
+            '@@time {0}\n'
+            '@@unit ops-sysd.service 2 /system.slice/ops-sysd.service\n'
+            '@@file ops-sysd.service memory.current\n{1}\n'
+            '@@file ops-sysd.service memory.stat\nanon 100\nfile 200\n'
+            '@@file ops-sysd.service cpu.stat\n'
+            'usage_usec {2}\nuser_usec 10\nsystem_usec 5\n'
+            '@@file ops-sysd.service io.stat\n'
+            '8:0 rbytes={3} wbytes=0 rios=1 wios=0\n'
+            '@@unit ops-old.service 1 /system.slice/ops-old.service\n'
+            '@@file ops-old.service memory/memory.usage_in_bytes\n4096\n'
+            '@@file ops-old.service cpuacct/cpuacct.usage\n{2}000\n'
+            '@@file ops-old.service cpuacct/cpuacct.stat\nuser 3\nsystem 1\n'
+            '@@file ops-old.service blkio/blkio.throttle.io_service_bytes\n'
+            '8:0 Read {3}\n8:0 Write 7\nTotal {3}\n'
+        ).format(timestamp, memory, usec, rbytes)
+
+    enode = FakeEnode(
+        reading(100.0, 8192, 1000000, 0), reading(102.0, 4096, 2000000, 500)
+    )
+    units = ['ops-sysd.service', 'ops-old.service']
+    before = library.get_units_cgroup_usage(enode, units)
+    after = library.get_units_cgroup_usage(enode, units)
+
+    assert len(enode.commands) == 2
+    sysd = before.units['ops-sysd.service']
+    assert sysd['version'] == 2
+    assert sysd['memory'] == 8192
+    assert sysd['memory_stat']['file'] == 200
+    assert sysd['cpu_usec'] == 1000000
+    old = before.units['ops-old.service']
+    assert old['version'] == 1
+    assert old['cpu_usec'] == 1000000
+    assert old['cpu_user_usec'] == 30000
+    assert old['io_write_bytes'] == 7
+
+    rates = before.rates(after)
+    assert rates['ops-sysd.service']['memory'] == -4096
+    assert rates['ops-sysd.service']['cpu_percent'] == 50.0
+    assert rates['ops-old.service']['io_read_rate'] == 250.0
+
+
+def test_get_pressure():
+    """
+    Check that stall rates are computed over a node-side window and checked
+    against thresholds.
+    """
+    def reading(timestamp, some, full):
+        return (
+            '@@time {0}\n'
+            '@@psi system cpu\n'
+            'some avg10=0.00 avg60=0.00 avg300=0.00 total={1}\n'
+            '@@psi system memory\n'
+            'some avg10=0.00 avg60=0.00 avg300=0.00 total={1}\n'
+            'full avg10=0.00 avg60=0.00 avg300=0.00 total={2}\n'
+            '@@psi ops-sysd.service memory\n'
+            'some avg10=0.00 avg60=0.00 avg300=0.00 total={2}\n'
+            'full avg10=0.00 avg60=0.00 avg300=0.00 total={2}\n'
+        ).format(timestamp, some, full)
+
+    output = '##before\n{}##after\n{}'.format(
+        reading(10.0, 0, 0), reading(12.0, 200000, 20000)
+    )
+    rates = library.get_pressure(
+        FakeEnode(output), window=2, units=['ops-sysd.service'],
+        thresholds={'memory': 20, 'memory.full': 2}
+    )
+
+    assert rates['system']['cpu'] == {'some': 10.0, 'full': None}
+    assert rates['system']['memory'] == {'some': 10.0, 'full': 1.0}
+    assert rates['ops-sysd.service']['memory']['full'] == 1.0
+
+    with pytest.raises(AssertionError):
+        library.get_pressure(
+            FakeEnode(output), window=2, thresholds={'memory': 5}
+        )
+
+
+def gzip_base64(text):
+    """
+    gzip compress and base64 encode a text, as the agent pulls do.
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as fd:
+        fd.write(text.encode('utf-8'))
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def test_sampling_agent():
+    """
+    Check that the agent samples are pulled in compressed chunks and that
+    a partially written line is left for the next pull.
+    """
+    lines = [
+        '{}.5 {} 0 1 8 0 0 0 0 0 0 MemTotal=2048 MemAvailable={} .'.format(
+            second, second, 1024 - second
+        )
+        for second in range(3)
+    ]
+    chunk = gzip_base64('\n'.join(lines[:2] + ['2.5 2 0']))
+    enode = FakeEnode(
+        '@@pid 321',
+        '@@chunk\n' + chunk[:40] + '\n' + chunk[40:],
+        '@@chunk\n' + gzip_base64(lines[2]),
+        ''
+    )
+    agent = library.start_sampling_agent(
+        enode, interval=0.5, path='/tmp/agent.log', compress=True
+    )
+    assert agent.pid == 321
+    assert "setsid sh -c 'echo \"@@pid $$\"" in enode.commands[0]
+
+    samples = agent.pull()
+    assert [sample.timestamp for sample in samples] == [0.5, 1.5]
+    assert samples[1].cpu['cpu'][:4] == [1, 0, 1, 8]
+    assert samples[1].meminfo['MemAvailable'] == 1023
+    assert 'tail -n +1 /tmp/agent.log' in enode.commands[1]
+
+    samples = agent.pull()
+    assert [sample.timestamp for sample in samples] == [2.5]
+    assert 'tail -n +3 /tmp/agent.log' in enode.commands[2]
+
+    agent.stop()
+    assert enode.commands[3] == (
+        'kill -TERM -- -321 2>/dev/null; rm -f /tmp/agent.log'
+    )
+
+
+def test_sampling_agent_pull_all(tmpdir):
+    """
+    Check that malformed lines do not end a bulk pull early, and that an
+    unfinished last line is left for the next pull.
+    """
+    lines = [
+        '{}.5 {} 0 1 8 0 0 0 0 0 0 MemTotal=2048 .'.format(second, second)
+        for second in range(9)
+    ]
+    lines.insert(4, 'garbage')
+    path = tmpdir.join('agent.log')
+    path.write('\n'.join(lines) + '\n9.5 9 0')
+    with LocalEnode() as enode:
+        agent = SamplingAgent(enode, path=str(path))
+        samples = agent.pull_all(chunk=3)
+        assert [sample.timestamp for sample in samples] == [
+            second + 0.5 for second in range(9)
+        ]
+        assert agent.offset == 10
+
+        path.write(' 0 1 8 0 0 0 0 0 MemTotal=2048 .\n', mode='a')
+        assert [sample.timestamp for sample in agent.pull(3)] == [9.5]
+
+
+@pytest.mark.parametrize('job_control', [False, True])
+def test_sampling_agent_local(job_control, tmpdir):
+    """
+    Check that stopping the agent kills its loop and removes its file, also
+    when the node shell has job control enabled.
+    """
+    path = str(tmpdir.join('agent.log'))
+    with LocalEnode() as enode:
+        if job_control:
+            enode('set -m')
+        agent = library.start_sampling_agent(enode, interval=0.05, path=path)
+        pgid = agent.pid
+        time.sleep(0.3)
+        assert live_processes(pgid)
+        assert len(agent.pull()) > 1
+        agent.stop()
+        time.sleep(0.2)
+        assert live_processes(pgid) == []
+        assert not os.path.exists(path)
+
+
+def test_batch():
+    """
+    Check that batched calls share one round trip and that each call is
+    completed from its own slice of the output.
+    """
+    enode = ReplayEnode(units=20)
+    with Batch(enode) as batch:
+        failed = batch.check_failed_services()
+        memory = batch.get_memory_usage()
+        cpu = batch.get_cpu_usage(window=0.1)
+        missing = batch.call(library.get_unit_properties, [])
+
+    assert enode.round_trips == 1
+    assert failed.result() == ['unit-9.service', 'unit-19.service']
+    assert memory.result()['memTotal'] == '2048000'
+    assert cpu.result()['cpu']['busy'] > 0
+    assert isinstance(missing.error, AssertionError)
+    with pytest.raises(AssertionError):
+        missing.result()
+
+    # Later commands of multi-command functions go to the node as usual
+    with Batch(enode) as batch:
+        rate = batch.get_cpu_usage()
+    assert enode.round_trips == 3
+    assert 0 < rate.result() < 1
+
+
+def test_batch_unit_cache():
+    """
+    Check that batched calls hit and invalidate the unit cache of the node.
+    """
+    enode = ReplayEnode(units=20)
+    library.enable_unit_cache(enode, ttl=60)
+    try:
+        library.list_all_units(enode)
+        with Batch(enode) as batch:
+            units = batch.list_all_units()
+            failed = batch.check_failed_services()
+        assert enode.round_trips == 1
+        assert len(units.result()) == 20
+        assert failed.result() == ['unit-9.service', 'unit-19.service']
+
+        with Batch(enode) as batch:
+            batch.kill_daemons(['daemon-0'])
+        assert enode.round_trips == 2
+        assert library.unit_cache_stats(enode)['entries'] == 0
+        library.list_all_units(enode)
+        assert enode.round_trips == 3
+    finally:
+        library.disable_unit_cache(enode)
+
+    batch = Batch(enode)
+    with pytest.raises(AssertionError):
+        batch.read_journal(['unit-0.service'])
+    with pytest.raises(AssertionError):
+        batch.call('start_resource_sampler')
+    with pytest.raises(AssertionError):
+        batch.start_sampling_agent()
+
+    # A replay issuing another command fails instead of reaching the node
+    commands = iter(['echo first', 'echo second'])
+
+    def changing(enode):
+        return enode(next(commands), shell='bash')
+
+    enode.reset()
+    with Batch(enode) as batch:
+        changed = batch.call(changing)
+    assert enode.round_trips == 1
+    with pytest.raises(AssertionError):
+        changed.result()
+
+
+def test_triage_failed_units():
+    """
+    Check that the failed units are triaged in one enode call.
+    """
+    enode = FakeEnode(
+        '@@show a.service\n'
+        'Result=exit-code\nExecMainCode=1\nExecMainStatus=3\nNRestarts=5\n'
+        'StateChangeTimestamp=Mon 2016-05-02 10:00:00 UTC\n'
+        'StateChangeTimestampMonotonic=1500000\n'
+        '@@journal a.service\n'
+        '{"__CURSOR": "c1", "MESSAGE": "starting", "PRIORITY": "6"}\n'
+        '{"__CURSOR": "c2", "MESSAGE": "bad config", "PRIORITY": "3"}\n'
+        '@@show b.service\n'
+        'Result=timeout\nExecMainCode=0\nExecMainStatus=0\nNRestarts=0\n'
+        'StateChangeTimestamp=\nStateChangeTimestampMonotonic=0\n'
+        '@@journal b.service'
+    )
+    report = library.triage_failed_units(enode, lines=2)
+
+    assert len(enode.commands) == 1
+    assert '-n 2 -u $unit' in enode.commands[0]
+    assert list(report) == ['a.service', 'b.service']
+    failed = report['a.service']
+    assert (failed.result, failed.exit_status, failed.restarts) == \
+        ('exit-code', 3, 5)
+    assert failed.failed_at_monotonic == 1500000
+    assert [record.message for record in failed.journal] == \
+        ['starting', 'bad config']
+    assert failed.summary() == (
+        'a.service: result=exit-code status=3 restarts=5 failed at '
+        'Mon 2016-05-02 10:00:00 UTC: bad config'
+    )
+    assert report['b.service'].journal == []
+    assert report['b.service'].failed_at is None